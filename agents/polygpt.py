@@ -1,24 +1,94 @@
-from typing import Any
+import weakref
+from typing import Any, Dict
+from autogen import ChatCompletion
 from agents.agents_initializer import AgentInitializer
 from utils.autogen_monitor import AutogenMonitor
+from utils.event_dispatcher import EventDispatcher
+from utils.metrics import LATENCY_METRICS, LatencyRegistry
+from utils.monitoring_profiles import MonitoringProfile
+from utils.persistence_queue import WriteBehindQueue
 
 from utils.observer import Observable
 from utils.poly_logger import PolyLogger
 from utils.reaction import PolyAutogenReact 
+from utils.usage_metrics import USAGE_METRICS, install_completion_hook
 
 LOG = PolyLogger(__name__)
 
 
+def _queue_usage(persistence: WriteBehindQueue, task_ids: set, keep: str = None):
+    """Queue the LLM usage of these tasks, recorded since the last flush, for the database."""
+    drained = set(task_ids)
+    # Only the attached task can still accrue usage through this instance
+    task_ids.intersection_update({keep} if keep else set())
+    if not hasattr(persistence.database, "add_task_usage"):
+        return
+    for task_id, rows in USAGE_METRICS.drain_tasks(drained).items():
+        persistence.call("add_task_usage", task_id, rows)
+
+
+def _shutdown(dispatcher: EventDispatcher, persistence: WriteBehindQueue, usage_task_ids: set):
+    """
+    Stop an instance's workers in order: the dispatcher delivers its last events into the
+    persistence queue before that queue is closed. Runs from close(), when the instance is
+    garbage collected, or at exit, and holds no reference to the instance itself.
+    """
+    if dispatcher is not None:
+        dispatcher.stop()
+    _queue_usage(persistence, usage_task_ids)
+    persistence.close()
+
+
 class PolyGPTAgents(Observable):
-    def __init__(self, database, workspace):
-        super().__init__()
+    def __init__(self, database, workspace, dispatch_mode: str = "background",
+                 event_dispatcher: EventDispatcher = None,
+                 monitoring_profile: MonitoringProfile | str = None,
+                 agent_monitoring_profiles: Dict[str, MonitoringProfile | str] = None,
+                 observer_timeout: float = None, max_observer_concurrency: int = None):
+        # The same async delivery limits apply to this instance's observers and
+        # to the monitors' fan-out into receive_notification.
+        super().__init__(observer_timeout=observer_timeout,
+                         max_concurrency=max_observer_concurrency)
         self.agent_monitors = []
         self.forge_agent = None
         self.database = database
         self.workspace = workspace
         self.reactions = {}
+        # (agent name, event) -> (agent, bound reaction handler, requires_task_id)
+        self._reaction_table = {}
+        # This instance's call latencies; they are also recorded in the exported
+        # process-wide LATENCY_METRICS
+        self.latency_registry = LatencyRegistry(parent=LATENCY_METRICS)
+        # Merged into every monitor event so reactions can persist per task
+        self.task_context = {}
+        # Shared write-behind buffer for every agent's reaction persistence
+        self.persistence = WriteBehindQueue(database, workspace)
+        # Token usage of every completion; monitors attribute it to their agent and task
+        install_completion_hook(ChatCompletion)
+        # Tasks attached to this instance whose usage has not been persisted yet
+        self._usage_task_ids = set()
+
+        # Profile used for every agent, optionally overridden per agent name
+        self.monitoring_profile = monitoring_profile
+        self.agent_monitoring_profiles = agent_monitoring_profiles or {}
+
+        # "background" queues monitor events on a shared dispatcher thread,
+        # "sync" notifies observers inline inside every wrapped agent call.
+        if dispatch_mode == "background":
+            self.event_dispatcher = event_dispatcher or EventDispatcher()
+            # A dispatcher passed in may be shared with other instances
+            self._owns_dispatcher = event_dispatcher is None
+        elif dispatch_mode == "sync":
+            self.event_dispatcher = None
+            self._owns_dispatcher = False
+        else:
+            raise ValueError(f"Unsupported dispatch mode: {dispatch_mode}")
 
         self._initialize_agents()
+        # One ordered shutdown, at close() or exit, that does not keep the instance alive
+        self._finalizer = weakref.finalize(
+            self, _shutdown, self.event_dispatcher if self._owns_dispatcher else None,
+            self.persistence, self._usage_task_ids)
 
     def _initialize_agents(self):
         self.agent_initializer = AgentInitializer(
@@ -30,42 +100,100 @@ class PolyGPTAgents(Observable):
         for agent_name, agent in self.agents.items():
             if agent_name not in self.reactions:
                 self.reactions[agent_name] = PolyAutogenReact (
-                    agent, self.database, self.workspace)
+                    agent, self.database, self.workspace, self.persistence)
 
+            profile = self.agent_monitoring_profiles.get(
+                agent_name, self.monitoring_profile)
             agent_monitor = AutogenMonitor(
-                agent, self, self.groupchat, self.manager)
-
-            for event_name in agent_monitor.default_monitored_methods:
+                agent, self, self.groupchat, self.manager,
+                dispatcher=self.event_dispatcher, profile=profile,
+                latency_registry=self.latency_registry)
+            agent_monitor.configure_async_delivery(
+                observer_timeout=self.observer_timeout,
+                max_concurrency=self.max_concurrency)
+
+            # Monitors only deliver the events some reaction actually handles.
+            handlers = self.reactions[agent_name].compile_handlers(
+                agent_monitor.monitored_methods)
+            for event_name, (handler, requires_task) in handlers.items():
+                self._reaction_table[(agent.name, event_name)] = (agent, handler, requires_task)
                 agent_monitor.add_observer(self.receive_notification, event=event_name)
+                if requires_task:
+                    # Not even captured until set_current_task attaches a task
+                    agent_monitor.require_task(event_name)
 
+            agent_monitor.task_context = self.task_context
             self.agent_monitors.append(agent_monitor)
 
+    def add_observer(self, observer, event='default', weak=False, timeout=None):
+        super().add_observer(observer, event, weak=weak, timeout=timeout)
+        # Forward the matching monitor events even if no reaction handles them.
+        prefix = event[:-1] if event.endswith('*') else None
+        for monitor in self.agent_monitors:
+            for method_name in monitor.monitored_methods:
+                if method_name == event or (prefix is not None and method_name.startswith(prefix)):
+                    monitor.add_observer(self.receive_notification, event=method_name)
+
+    def set_current_task(self, task_id: str = None, step_id: str = None):
+        """Attach a task (and step) to subsequent monitor events; pass None to detach."""
+        self.task_context.clear()
+        if task_id is not None:
+            self.task_context['current_task_id'] = task_id
+            self._usage_task_ids.add(task_id)
+        if step_id is not None:
+            self.task_context['current_step_id'] = step_id
+
+    def suppressed_event_counts(self) -> Dict[str, Dict[str, int]]:
+        """Events skipped by sampling or rate limits, per agent and method."""
+        return {monitor.agent.name: dict(monitor.suppressed_events)
+                for monitor in self.agent_monitors}
+
+    def latency_snapshot(self) -> Dict[str, Dict[str, dict]]:
+        """Latency percentiles of this instance's monitored methods, per agent and method."""
+        return self.latency_registry.snapshot()
+
     def set_forge_agent(self, agent):
         self.forge_agent = agent
 
     def start_chat(self, user_input):
-        self.agent_initializer.initiate_chat(user_input)
+        try:
+            self.agent_initializer.initiate_chat(user_input)
+        finally:
+            self.flush_events()
+
+    def flush_events(self, timeout: float = None) -> bool:
+        """Block until all queued monitor events have reached their observers and been persisted."""
+        delivered = True
+        if self.event_dispatcher is not None:
+            delivered = self.event_dispatcher.flush(timeout)
+        self._persist_usage()
+        return self.persistence.flush(timeout) and delivered
+
+    def _persist_usage(self):
+        _queue_usage(self.persistence, self._usage_task_ids, self.task_context.get('current_task_id'))
+
+    def replay_task_events(self, task_id: str, start_seq: int = 0):
+        """Iterate over the persisted event log of a task, oldest first."""
+        self.persistence.flush()
+        return self.persistence.event_log.replay(task_id, start_seq)
+
+    def close(self):
+        """Deliver and persist everything still buffered, then stop the background workers."""
+        if not self._owns_dispatcher and self.event_dispatcher is not None:
+            # Shared: deliver our events but keep it running for the others
+            self.event_dispatcher.flush()
+        self._finalizer()
 
     async def receive_notification(self, event: str, data: Any):
         try:
-            agent_name = data.get('agent_name').lower()
-            if not agent_name:
-                return
-
-            agent = self.agents.get(agent_name)
-            if not agent:
-                return
-
-            agent_reactions = self.reactions.get(agent_name)
-
-            if agent_reactions:
-                reaction_method_name = f"on_{event}"
-                reaction_method = getattr(
-                    agent_reactions, reaction_method_name, agent_reactions.default_reaction)
-
-                reaction_method(agent, data)
-
-            await self.notify_observers_async(event, data)
+            reaction = self._reaction_table.get((data.get('agent_name'), event))
+            if reaction is not None:
+                agent, handler, requires_task = reaction
+                if not requires_task or 'current_task_id' in data:
+                    handler(agent, data)
+
+            if self.has_observers(event):
+                await self.notify_observers_async(event, data)
 
         except Exception as e:
             LOG.error(f"Error in receive_notification: {e}")
@@ -0,0 +1,89 @@
+"""
+Compare AgentDB engine profiles on task create/list workloads.
+
+    python -m benchmarks.db_engine_profiles --tasks 2000 --threads 8
+
+Each profile gets a fresh SQLite file. Writers run in parallel threads, the way
+concurrent task runs share one database, followed by paging through all tasks.
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+from utils.engine_profiles import ENGINE_PROFILES
+from utils.mongo_db import AgentDB
+
+
+def _create_tasks(db: AgentDB, count: int, errors: list):
+    async def run():
+        for i in range(count):
+            await db.create_task(f"benchmark task {i}", {"i": i})
+
+    try:
+        asyncio.run(run())
+    except Exception as e:
+        errors.append(e)
+
+
+def _list_tasks(db: AgentDB, total: int, per_page: int):
+    async def run():
+        for page in range(1, total // per_page + 2):
+            await db.list_tasks(page=page, per_page=per_page)
+
+    asyncio.run(run())
+
+
+def bench_profile(profile: str, tasks: int, threads: int, per_page: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = AgentDB(f"sqlite:///{os.path.join(tmp, 'bench.db')}", engine_profile=profile)
+        errors: list = []
+        per_thread = tasks // threads
+
+        started = time.perf_counter()
+        workers = [
+            threading.Thread(target=_create_tasks, args=(db, per_thread, errors))
+            for _ in range(threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        create_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        _list_tasks(db, per_thread * threads, per_page)
+        list_seconds = time.perf_counter() - started
+
+        db.engine.dispose()
+        return {
+            "profile": profile,
+            "created": per_thread * threads - len(errors) * per_thread,
+            "errors": len(errors),
+            "create_per_sec": per_thread * threads / create_seconds,
+            "list_seconds": list_seconds,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--per-page", type=int, default=50)
+    parser.add_argument("--profiles", nargs="*", default=list(ENGINE_PROFILES))
+    args = parser.parse_args()
+
+    print(f"{'profile':<10} {'created':>8} {'errors':>7} {'creates/s':>10} {'list s':>8}")
+    for profile in args.profiles:
+        result = bench_profile(profile, args.tasks, args.threads, args.per_page)
+        print(
+            f"{result['profile']:<10} {result['created']:>8} {result['errors']:>7} "
+            f"{result['create_per_sec']:>10.1f} {result['list_seconds']:>8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
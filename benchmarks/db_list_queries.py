@@ -0,0 +1,107 @@
+"""
+Count the SQL statements issued by AgentDB.list_tasks and fail on N+1 loading.
+
+    python -m benchmarks.db_list_queries --tasks 1000
+
+Every task gets one artifact. A full listing must take the page query, the total
+count and one selectin query per 500 tasks (SQLAlchemy's IN batch size) for the
+artifacts, instead of one artifact query per task; summary mode must not touch
+the artifacts table at all.
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import tempfile
+import time
+
+from sqlalchemy import event, insert
+
+from utils.mongo_db import AgentDB, ArtifactModel, TaskModel, sequential_timestamps
+
+# Primary keys per IN (...) query issued by selectinload
+SELECTIN_BATCH_SIZE = 500
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.statements = []
+        event.listen(engine, "before_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def reset(self):
+        self.statements = []
+
+    def touching(self, table: str) -> int:
+        return sum(f"FROM {table}" in statement for statement in self.statements)
+
+
+def _seed(db: AgentDB, tasks: int):
+    timestamps = sequential_timestamps(tasks)
+    task_rows = [
+        {"task_id": f"task-{i:06d}", "input": f"benchmark task {i}", "additional_input": {},
+         "created_at": created_at, "modified_at": created_at}
+        for i, created_at in enumerate(timestamps)
+    ]
+    artifact_rows = [
+        {"artifact_id": f"artifact-{i:06d}", "task_id": f"task-{i:06d}", "file_name": f"{i}.py",
+         "relative_path": "code", "created_at": created_at, "modified_at": created_at}
+        for i, created_at in enumerate(timestamps)
+    ]
+    with db.Session() as session:
+        session.execute(insert(TaskModel), task_rows)
+        session.execute(insert(ArtifactModel), artifact_rows)
+        session.commit()
+
+
+async def run(tasks: int) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = AgentDB(f"sqlite:///{os.path.join(tmp, 'bench.db')}", count_ttl=0)
+        _seed(db, tasks)
+        counter = QueryCounter(db.engine)
+
+        for label, summary in (("full", False), ("summary", True)):
+            counter.reset()
+            started = time.perf_counter()
+            listed, pagination = await db.list_tasks(page=1, per_page=tasks, summary=summary)
+            elapsed = time.perf_counter() - started
+            results[label] = {
+                "tasks": len(listed),
+                "artifacts": sum(len(task.artifacts) for task in listed),
+                "statements": len(counter.statements),
+                "artifact_statements": counter.touching("artifacts"),
+                "seconds": elapsed,
+            }
+        await db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=1000)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.tasks))
+    print(f"{'mode':<8} {'tasks':>6} {'artifacts':>10} {'statements':>11} {'seconds':>8}")
+    for mode, result in results.items():
+        print(
+            f"{mode:<8} {result['tasks']:>6} {result['artifacts']:>10} "
+            f"{result['statements']:>11} {result['seconds']:>8.3f}"
+        )
+
+    full, summary = results["full"], results["summary"]
+    artifact_batches = math.ceil(args.tasks / SELECTIN_BATCH_SIZE)
+    assert full["tasks"] == full["artifacts"] == args.tasks, full
+    assert full["artifact_statements"] == artifact_batches, \
+        f"list_tasks issued {full['artifact_statements']} artifact queries (N+1 loading?)"
+    assert full["statements"] == 2 + artifact_batches, full
+    assert summary["statements"] <= 2 and summary["artifact_statements"] == 0, summary
+    print("ok: no per-task artifact queries")
+
+
+if __name__ == "__main__":
+    main()
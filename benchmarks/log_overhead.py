@@ -0,0 +1,79 @@
+"""
+Measure the per-event cost of hot-path logging when the level filters it out.
+
+    python -m benchmarks.log_overhead --events 20000
+
+Compares an eager f-string LOG.info with LOG.info_lazy for a typical event data
+dict, then times a monitored agent method end to end (wrapper, payload, inline
+observer fan-out and both monitor log calls) with the monitor logger at WARNING
+and at DEBUG.
+"""
+
+import argparse
+import logging
+import time
+
+import utils.autogen_monitor as autogen_monitor
+from utils.autogen_monitor import AutogenMonitor
+from utils.poly_logger import PolyLogger
+
+
+def _event_data():
+    messages = [{"role": "assistant", "content": "word " * 200, "name": f"agent-{i}"} for i in range(20)]
+    return {"agent_name": "Engineer", "current_task_id": "task-1", "data": {"messages": messages}}
+
+
+def _per_event_us(fn, events: int) -> float:
+    started = time.perf_counter()
+    for _ in range(events):
+        fn()
+    return (time.perf_counter() - started) / events * 1e6
+
+
+class _Agent:
+    name = "Engineer"
+
+    def send(self, message, recipient=None, request_reply=None):
+        return message
+
+
+def bench_log_calls(events: int) -> dict:
+    log = PolyLogger("benchmarks.log_overhead")
+    log.setLevel(logging.WARNING)
+    data = _event_data()
+    return {
+        "eager f-string": _per_event_us(lambda: log.info(f"🔔 Engineer: NOTIFYING EVENT: send DATA: {data}"), events),
+        "info_lazy": _per_event_us(lambda: log.info_lazy(lambda: f"🔔 Engineer: NOTIFYING EVENT: send DATA: {data}"), events),
+    }
+
+
+def bench_monitor(events: int, level: int) -> float:
+    autogen_monitor.LOG.setLevel(level)
+    # Keep DEBUG records from piling up in the console while timing
+    handlers = autogen_monitor.LOG.handlers
+    autogen_monitor.LOG.handlers = [logging.NullHandler()]
+    try:
+        agent = _Agent()
+        monitor = AutogenMonitor(agent, None, None, None, methods_to_monitor=["send"], profile="debug")
+        monitor.add_observer(lambda event, data: None, "send")
+        message = _event_data()["data"]["messages"]
+        return _per_event_us(lambda: agent.send(message), events)
+    finally:
+        autogen_monitor.LOG.handlers = handlers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'case':<32} {'us/event':>9}")
+    for case, cost in bench_log_calls(args.events).items():
+        print(f"{'LOG at WARNING, ' + case:<32} {cost:>9.2f}")
+    for level in (logging.WARNING, logging.DEBUG):
+        cost = bench_monitor(args.events // 4, level)
+        print(f"{'monitor, LOG at ' + logging.getLevelName(level):<32} {cost:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
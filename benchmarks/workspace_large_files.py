@@ -0,0 +1,84 @@
+"""
+Compare whole-file and streaming Workspace I/O on a large artifact.
+
+    python -m benchmarks.workspace_large_files --size-mb 1024
+
+Each mode writes the artifact and then hashes it back, reporting wall time and the
+peak Python heap traced during the mode. Whole-file read()/write() hold the full
+payload in memory, while open_write/open_read stay at one chunk and mmap hashes the
+page-cache mapping without copying it onto the heap.
+"""
+
+import argparse
+import hashlib
+import tempfile
+import time
+import tracemalloc
+
+from utils.workspace import ContentAddressedWorkspace, LocalWorkspace, STREAM_CHUNK_SIZE
+
+_CHUNK = bytes(range(256)) * (STREAM_CHUNK_SIZE // 256)
+
+
+def _chunks(size: int):
+    for offset in range(0, size, len(_CHUNK)):
+        yield _CHUNK[: min(len(_CHUNK), size - offset)]
+
+
+def whole_file(workspace, size: int) -> str:
+    workspace.write("bench", "artifact.bin", b"".join(_chunks(size)))
+    return hashlib.sha256(workspace.read("bench", "artifact.bin")).hexdigest()
+
+
+def streaming(workspace, size: int) -> str:
+    with workspace.open_write("bench", "artifact.bin") as f:
+        for chunk in _chunks(size):
+            f.write(chunk)
+    digest = hashlib.sha256()
+    with workspace.open_read("bench", "artifact.bin") as f:
+        while chunk := f.read(STREAM_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def mmapped(workspace, size: int) -> str:
+    with workspace.open_write("bench", "artifact.bin") as f:
+        for chunk in _chunks(size):
+            f.write(chunk)
+    with workspace.mmap("bench", "artifact.bin") as view:
+        return hashlib.sha256(view).hexdigest()
+
+
+MODES = {"whole-file": whole_file, "streaming": streaming, "mmap": mmapped}
+WORKSPACES = {"local": LocalWorkspace, "content-addressed": ContentAddressedWorkspace}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--modes", nargs="*", default=list(MODES))
+    parser.add_argument("--workspaces", nargs="*", default=list(WORKSPACES))
+    args = parser.parse_args()
+    size = args.size_mb * 1024 * 1024
+
+    print(f"{'workspace':<18} {'mode':<11} {'seconds':>8} {'MB/s':>8} {'peak heap MB':>13}")
+    digests = set()
+    for workspace_name in args.workspaces:
+        for mode in args.modes:
+            with tempfile.TemporaryDirectory() as tmp:
+                workspace = WORKSPACES[workspace_name](tmp)
+                tracemalloc.start()
+                started = time.perf_counter()
+                digests.add(MODES[mode](workspace, size))
+                elapsed = time.perf_counter() - started
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            print(
+                f"{workspace_name:<18} {mode:<11} {elapsed:>8.2f} "
+                f"{2 * args.size_mb / elapsed:>8.0f} {peak / 2**20:>13.1f}"
+            )
+    assert len(digests) == 1, "modes read back different data"
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,119 @@
+import json
 import os
-from autogen.oai.openai_utils import config_list_from_json
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from autogen.oai.openai_utils import filter_config
+
+from utils.poly_logger import PolyLogger
+
+LOG = PolyLogger(__name__)
+
+"""
+OAI_CONFIG_LIST.json discovery and parsing, shared by every LlmConfiguration.
+The file is looked up from the working directory upwards once per directory, parsed
+once and cached by path and modification time. Each model filter gets its own cached
+view of the parsed list, so callers with different filters no longer share whichever
+list was loaded first. A changed file is picked up on the next access.
+"""
+
+CONFIG_FILE_NAME = "OAI_CONFIG_LIST.json"
+
+
+def _filter_key(filter_llms: Optional[Sequence[str]]) -> Optional[Tuple[str, ...]]:
+    return tuple(sorted(set(filter_llms))) if filter_llms else None
+
+
+class LlmConfigRegistry:
+    """Parsed config lists keyed by file path, with per-filter views, reloaded on change."""
+
+    def __init__(self):
+        # (working directory, file name) -> config file path
+        self._paths: Dict[Tuple[str, str], str] = {}
+        # path -> ((mtime_ns, size), parsed config list, filter key -> view)
+        self._files: Dict[str, Tuple[Tuple[int, int], List[dict], Dict]] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def find(self, file_name: str = CONFIG_FILE_NAME) -> str:
+        """Path of the config file in the working directory or its closest parent."""
+        key = (os.getcwd(), file_name)
+        path = self._paths.get(key)
+        if path is not None and os.path.exists(path):
+            return path
 
-class LlmConfiguration:
-    _instance = None
-    _is_initialized = False
-    
-    def __new__(cls, filter_llms=None):
-        if not cls._instance:
-            cls._instance = super(LlmConfiguration, cls).__new__(cls)
-        return cls._instance
-
-    def __init__(self, filter_llms=None):
-        # Ensure that the initialization happens only once
-        if LlmConfiguration._is_initialized:
-            return
-
-        file_name = "OAI_CONFIG_LIST.json"
-        filter_dict = None
-
-        # If filter_llms is provided, use it for filtering
-        if filter_llms:
-            filter_dict = {"model": filter_llms}
-
-        self.config = self._find_and_load_config(file_name, filter_dict)
-        LlmConfiguration._is_initialized = True
-
-    def _find_and_load_config(self, file_name, filter_dict):
         # Search for the file starting from the current directory and moving to parent directories
-        current_dir = os.path.abspath(os.getcwd())
+        current_dir = os.path.abspath(key[0])
         while current_dir != os.path.dirname(current_dir):  # To prevent infinite loop on root dir
-            file_path = os.path.join(current_dir, file_name)
-            if os.path.exists(file_path):
-                return config_list_from_json(env_or_file=file_name, file_location=current_dir, filter_dict=filter_dict)
+            path = os.path.join(current_dir, file_name)
+            if os.path.exists(path):
+                self._paths[key] = path
+                return path
             # Move to parent directory
             current_dir = os.path.dirname(current_dir)
         raise FileNotFoundError(f"'{file_name}' not found in any parent directories.")
 
+    def get(self, filter_llms: Optional[Sequence[str]] = None,
+            file_name: str = CONFIG_FILE_NAME) -> List[dict]:
+        """The config list filtered to the given models (all of them if None)."""
+        path = self.find(file_name)
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        filter_key = _filter_key(filter_llms)
+        with self._lock:
+            cached = self._files.get(path)
+            if cached is None or cached[0] != version:
+                cached = self._load(path, version)
+            views = cached[2]
+            view = views.get(filter_key)
+            if view is None:
+                view = views[filter_key] = (
+                    filter_config(cached[1], {"model": list(filter_key)}) if filter_key else cached[1])
+        # Agents may adjust their copy of an entry; keep the cached one intact
+        return [dict(config) for config in view]
+
+    def invalidate(self, path: Optional[str] = None):
+        """Forget parsed files (all of them by default) and the directory lookups."""
+        with self._lock:
+            if path is None:
+                self._files.clear()
+            else:
+                self._files.pop(path, None)
+            self._paths.clear()
+
+    def _load(self, path: str, version: Tuple[int, int]):
+        with open(path) as f:
+            config_list = json.load(f)
+        if path in self._files:
+            LOG.info(f"Reloaded LLM config list from {path}")
+        self.loads += 1
+        cached = self._files[path] = (version, config_list, {})
+        return cached
+
+
+LLM_CONFIGS = LlmConfigRegistry()
+
+
+class LlmConfiguration:
+    """
+    The LLM config list for a set of models. Every instance reads through the shared
+    registry, so `config` reflects the current file without re-reading it.
+    """
+
+    def __init__(self, filter_llms=None, file_name: str = CONFIG_FILE_NAME,
+                 registry: LlmConfigRegistry = None):
+        self.filter_llms = list(filter_llms) if filter_llms else None
+        self.file_name = file_name
+        self.registry = registry or LLM_CONFIGS
+        # Fail at construction when no config file can be found
+        self.registry.find(file_name)
+
+    @property
+    def config(self) -> List[dict]:
+        return self.registry.get(self.filter_llms, self.file_name)
+
     def __getitem__(self, key):
         return self.config[key]
 
+    def __repr__(self) -> str:
+        return f"LlmConfiguration(filter_llms={self.filter_llms!r}, file_name={self.file_name!r})"
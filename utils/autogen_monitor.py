@@ -1,8 +1,15 @@
 import asyncio
 import functools
+import time
+from collections import Counter
 
+from utils.event_dispatcher import EventDispatcher
+from utils.event_payload import DEFAULT_PAYLOAD_BUDGET, EventPayload
+from utils.metrics import LATENCY_METRICS, LatencyRegistry
+from utils.monitoring_profiles import MonitoringProfile, get_monitoring_profile
 from utils.observer import Observable
 from utils.poly_logger import PolyLogger
+from utils.usage_metrics import CURRENT_AGENT, CURRENT_TASK
 
 
 LOG = PolyLogger(__name__)
@@ -16,7 +23,9 @@ This can be very powerful for debugging, metrics collection, or other cross-cutt
 
 
 class AutogenMonitor(Observable):
-    def __init__(self, agent, polygpt_agents, groupchat, manager, methods_to_monitor=None):
+    def __init__(self, agent, polygpt_agents, groupchat, manager, methods_to_monitor=None,
+                 dispatcher: EventDispatcher = None, payload_budget: int = DEFAULT_PAYLOAD_BUDGET,
+                 profile: MonitoringProfile | str = None, latency_registry: LatencyRegistry = None):
         super().__init__()  # Call the __init__ method of Observable
 
         self.agent = agent
@@ -24,13 +33,33 @@ class AutogenMonitor(Observable):
         self.groupchat = groupchat
         self.manager = manager
         self.method_wrappers = set()
-
-        # Use provided methods to monitor or default to the property
+        # When a dispatcher is set, events are queued and delivered on its thread;
+        # otherwise observers are notified inline before the wrapped method runs.
+        self.dispatcher = dispatcher
+        self._inline_tasks = set()
+        # Upper bound, in bytes, for rendered event arguments.
+        self.payload_budget = payload_budget
+        # Extra keys (e.g. current_task_id) merged into every event's data
+        self.task_context = {}
+        # Events every observer ignores unless a task is attached; while task_context
+        # has no current_task_id their calls are not captured at all
+        self.task_only_events = set()
+        # Calls skipped by the profile's sampling or rate limits, per method name
+        self.suppressed_events = Counter()
+        self.profile = get_monitoring_profile(profile)
+        self.latency_registry = latency_registry or LATENCY_METRICS
+
+        # Use provided methods to monitor or default to the profile's methods
         if methods_to_monitor is None:
-            methods_to_monitor = self.default_monitored_methods
+            methods_to_monitor = self.profile.methods
         self.monitor_agent(methods_to_monitor)
 
-        LOG.info(f"AutogenAgentHelper initialized for agent {agent.name}.")
+        LOG.info(
+            f"AutogenAgentHelper initialized for agent {agent.name} with profile '{self.profile.name}'.")
+
+    @property
+    def monitored_methods(self):
+        return sorted(self.method_wrappers)
 
     @property
     def default_monitored_methods(self):
@@ -57,40 +86,121 @@ class AutogenMonitor(Observable):
         for method_name in methods_to_monitor:
             if hasattr(self.agent, method_name) and method_name not in self.method_wrappers:
                 method = getattr(self.agent, method_name)
-                wrapped_method = self.wrap_agent_method(method)
+                policy = self.profile.policy_for(method_name)
+                wrapped_method = self.wrap_agent_method(
+                    method, policy.clone() if policy else None)
                 setattr(self.agent, method_name, wrapped_method)
                 self.method_wrappers.add(method_name)
             else:
                 LOG.warning(
                     f"🚨 {self.agent.name}: METHOD {method_name} NOT FOUND or already wrapped")
 
-    def wrap_agent_method(self, func):
+    def wrap_agent_method(self, func, policy=None):
+        # CPU time is per thread, so for coroutines it also covers whatever else
+        # the event loop ran on that thread while the call was suspended.
         if asyncio.iscoroutinefunction(func):
             @functools.wraps(func)
             async def async_wrapper(*args, **kwargs):
-                self.register_method_call(func, args, kwargs)
-                return await func(*args, **kwargs)
+                overhead = self._emit(func, args, kwargs, policy)
+                error = None
+                # LLM usage recorded during the call is attributed to this agent and task
+                agent_token = CURRENT_AGENT.set(self.agent.name)
+                task_token = CURRENT_TASK.set(self.task_context.get('current_task_id'))
+                started, cpu_started = time.perf_counter(), time.thread_time()
+                try:
+                    return await func(*args, **kwargs)
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    CURRENT_TASK.reset(task_token)
+                    CURRENT_AGENT.reset(agent_token)
+                    self.latency_registry.record(
+                        self.agent.name, func.__name__, time.perf_counter() - started,
+                        time.thread_time() - cpu_started, error, overhead)
             return async_wrapper
         else:
             @functools.wraps(func)
             def sync_wrapper(*args, **kwargs):
-                self.register_method_call(func, args, kwargs)
-                return func(*args, **kwargs)
+                overhead = self._emit(func, args, kwargs, policy)
+                error = None
+                agent_token = CURRENT_AGENT.set(self.agent.name)
+                task_token = CURRENT_TASK.set(self.task_context.get('current_task_id'))
+                started, cpu_started = time.perf_counter(), time.thread_time()
+                try:
+                    return func(*args, **kwargs)
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    CURRENT_TASK.reset(task_token)
+                    CURRENT_AGENT.reset(agent_token)
+                    self.latency_registry.record(
+                        self.agent.name, func.__name__, time.perf_counter() - started,
+                        time.thread_time() - cpu_started, error, overhead)
             return sync_wrapper
 
+    def add_observer(self, observer, event='default', weak=False, timeout=None):
+        super().add_observer(observer, event, weak=weak, timeout=timeout)
+        # The new observer may want these events without a task
+        if event.endswith('*'):
+            prefix = event[:-1]
+            self.task_only_events = {e for e in self.task_only_events if not e.startswith(prefix)}
+        else:
+            self.task_only_events.discard(event)
+
+    def require_task(self, event):
+        """Skip `event` while no task is attached; call after its observers are added."""
+        self.task_only_events.add(event)
+
+    def _emit(self, func, args, kwargs, policy):
+        """Register the call if the profile admits it and return the time spent doing so."""
+        method_name = func.__name__
+        if not self.has_observers(method_name):
+            return None
+        if method_name in self.task_only_events and 'current_task_id' not in self.task_context:
+            return None
+        if not self._admit(method_name, policy):
+            return None
+        started = time.perf_counter()
+        self.register_method_call(func, args, kwargs)
+        return time.perf_counter() - started
+
+    def _admit(self, method_name, policy):
+        if policy is None or policy.allow():
+            return True
+        self.suppressed_events[method_name] += 1
+        return False
+
     def register_method_call(self, func, args, kwargs):
+        payload = EventPayload(args, kwargs, self.payload_budget)
         data_with_agent_name = {
-            'agent_name': self.agent.name, 'data': (args, kwargs)}
+            'agent_name': self.agent.name, 'data': payload, **self.task_context}
 
-        # Using an event loop to run the coroutine
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(self.notify(
-            func.__name__, data_with_agent_name))
+        if self.dispatcher is not None:
+            self.dispatcher.submit(self.notify, func.__name__, data_with_agent_name)
+        else:
+            self._notify_inline(func.__name__, data_with_agent_name)
 
-        # Consolidated logging for args and kwargs
-        LOG.info(
-            f"🔎 {self.agent.name}: {func.__name__} called with ARGS: {args} KWARGS: {kwargs}")
+        # Only the payload shape is logged; observers render the arguments on demand
+        LOG.info_lazy(
+            lambda: f"🔎 {self.agent.name}: {func.__name__} called with {payload.summary()}")
+
+    def _notify_inline(self, event, data):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        if loop is None:
+            asyncio.get_event_loop().run_until_complete(self.notify(event, data))
+        else:
+            # Called from inside a running loop (e.g. an async agent method):
+            # run_until_complete would raise, so schedule the fan-out instead.
+            task = loop.create_task(self.notify(event, data))
+            self._inline_tasks.add(task)
+            task.add_done_callback(self._inline_tasks.discard)
 
     async def notify(self, event, data):
         await super().notify_observers_async(event=event, data=data)
-        LOG.info(f"🔔 {self.agent.name}: NOTIFYING EVENT: {event} DATA: {data}")
+        LOG.info_lazy(lambda: f"🔔 {self.agent.name}: NOTIFYING EVENT: {event} DATA: {data}")
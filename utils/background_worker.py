@@ -0,0 +1,121 @@
+import abc
+import asyncio
+import threading
+from typing import Any, Optional
+
+from utils.poly_logger import PolyLogger
+
+LOG = PolyLogger(__name__)
+
+"""
+Lifecycle shared by the background workers (EventDispatcher, WriteBehindQueue).
+A daemon thread is started lazily and runs its own event loop until it takes STOP
+off the queue. A FlushMarker is acknowledged once everything queued before it has
+been handled. Items offered after stop(), or after the thread died, are refused so
+the caller can count them as dropped instead of queueing them where nothing reads.
+"""
+
+STOP = object()
+
+
+class FlushMarker:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class BackgroundWorker(abc.ABC):
+    """
+    Subclasses implement _enqueue (non-blocking, called under the lock), _enqueue_control
+    (for markers and STOP) and the _work coroutine; _prepare runs on the new loop first.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._started = threading.Event()
+        # Set once stop() has begun; never cleared, a stopped worker is not restarted
+        self._stopped = False
+
+    @property
+    def running(self) -> bool:
+        return not self._stopped and self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None or self._stopped:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        self._started.wait()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every item offered so far has been handled."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return True
+        if self._in_worker_thread():
+            # Waiting here would deadlock: the marker sits behind the caller.
+            return False
+        marker = FlushMarker()
+        self._enqueue_control(marker)
+        return marker.done.wait(timeout)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Queue STOP behind the pending items and wait for the thread to end."""
+        with self._lock:
+            self._stopped = True
+            thread = self._thread
+            if thread is None or not thread.is_alive():
+                return
+            # Under the lock so nothing is offered behind the stop marker
+            self._enqueue_control(STOP)
+        if not self._in_worker_thread():
+            # From the worker itself (a handler calling stop) STOP is simply taken next
+            thread.join(timeout)
+
+    def _offer(self, item: Any) -> bool:
+        """Queue an item, starting the worker on first use. Returns False if it was refused."""
+        if self._thread is None:
+            self.start()
+        with self._lock:
+            if not self.running:
+                return False
+            try:
+                self._enqueue(item)
+                return True
+            except Exception:
+                # Queue full, or the loop closed under us
+                return False
+
+    def _in_worker_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._prepare()
+        self._started.set()
+        try:
+            self._loop.run_until_complete(self._work())
+        except Exception as e:
+            LOG.error(f"{self.name} worker stopped: {e}")
+        finally:
+            self._loop.close()
+
+    def _prepare(self):
+        pass
+
+    @abc.abstractmethod
+    def _enqueue(self, item: Any):
+        pass
+
+    @abc.abstractmethod
+    def _enqueue_control(self, item: Any):
+        pass
+
+    @abc.abstractmethod
+    async def _work(self):
+        pass
@@ -0,0 +1,151 @@
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from utils.metrics import _escape, register_collector
+from utils.poly_logger import PolyLogger
+
+LOG = PolyLogger(__name__)
+
+"""
+Small in-process read-through caches.
+LRUCache keeps at most `max_size` entries, evicting the least recently used one, and
+optionally expires entries `ttl` seconds after they were stored. Every cache counts
+hits, misses, evictions, expirations and stale puts; all live caches are exported together in
+the Prometheus text format through utils.metrics.
+
+Read-through fills race with invalidation: a read that started before an invalidate
+can finish after it and store the old value. Readers take generation(key) before
+reading and pass it to put(), which skips the store if the key was invalidated since.
+"""
+
+MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, name: str, max_size: int = 1024, ttl: Optional[float] = None):
+        if max_size < 0:
+            raise ValueError(f"Cache max_size must be >= 0, got {max_size}")
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        # key -> (value, monotonic expiry or None)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by invalidate(); the epoch is bumped when many keys change at once
+        self._generations: Dict[Hashable, int] = {}
+        self._epoch = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_puts = 0
+        _caches.add(self)
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        """Return the cached value, or `default` (MISSING) if absent or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def generation(self, key: Hashable) -> tuple:
+        """Token to pass to put() for a value read from the source after this call."""
+        with self._lock:
+            return self._epoch, self._generations.get(key, 0)
+
+    def put(self, key: Hashable, value: Any, generation: Optional[tuple] = None):
+        """Store a value; with a generation token, only if the key was not invalidated since."""
+        if self.max_size == 0:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations.get(key, 0)):
+                self.stale_puts += 1
+                return
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
+            if len(self._generations) > max(4 * self.max_size, 1024):
+                # Keep the table bounded; in-flight reads of any key are then treated as stale
+                self._generations.clear()
+                self._epoch += 1
+
+    def invalidate_where(self, predicate: Callable[[Hashable, Any], bool]):
+        """Drop every entry for which predicate(key, value) is true."""
+        with self._lock:
+            for key in [k for k, (v, _) in self._entries.items() if predicate(k, v)]:
+                del self._entries[key]
+            self._epoch += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._epoch += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": self.size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "stale_puts": self.stale_puts,
+        }
+
+
+_caches: "weakref.WeakSet[LRUCache]" = weakref.WeakSet()
+
+
+class _CacheCollector:
+    namespace = "polygpt_cache"
+
+    def to_prometheus(self) -> str:
+        caches = sorted(list(_caches), key=lambda cache: cache.name)
+        lines: List[str] = []
+        for metric, kind, attribute in (
+            ("hits_total", "counter", "hits"),
+            ("misses_total", "counter", "misses"),
+            ("evictions_total", "counter", "evictions"),
+            ("expirations_total", "counter", "expirations"),
+            ("stale_puts_total", "counter", "stale_puts"),
+            ("size", "gauge", "size"),
+        ):
+            name = f"{self.namespace}_{metric}"
+            lines.append(f"# TYPE {name} {kind}")
+            for cache in caches:
+                lines.append(f'{name}{{cache="{_escape(cache.name)}"}} {getattr(cache, attribute)}')
+        return "\n".join(lines) + "\n"
+
+
+register_collector(_CacheCollector())
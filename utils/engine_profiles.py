@@ -0,0 +1,146 @@
+import os
+from typing import Any, Dict, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from utils.poly_logger import PolyLogger
+
+LOG = PolyLogger(__name__)
+
+"""
+Engine profiles bundle the connection pool settings and, for SQLite, the PRAGMAs
+applied to every new connection. AgentDB builds its engine through
+`create_profiled_engine`, so switching profiles never touches the query code.
+
+- baseline: a bare create_engine(), the historical behaviour.
+- tuned: pooled connections for server databases; for SQLite WAL journaling,
+  synchronous=NORMAL, a memory-mapped file, a larger page cache and a busy timeout,
+  so concurrent task runs stop serializing on the writer lock.
+
+Database strings naming an async driver (sqlite+aiosqlite://, postgresql+asyncpg://)
+get an AsyncEngine with the same profile settings.
+"""
+
+SQLITE_TUNED_PRAGMAS: Dict[str, Any] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # negative values are KiB
+    "busy_timeout": 5000,  # milliseconds
+    "temp_store": "MEMORY",
+}
+
+DEFAULT_ENGINE_PROFILE = os.environ.get("DATABASE_ENGINE_PROFILE", "tuned").lower()
+
+
+class EngineProfile:
+    def __init__(
+        self,
+        name: str,
+        pool_size: Optional[int] = None,
+        max_overflow: Optional[int] = None,
+        pool_recycle: Optional[int] = None,
+        pool_timeout: Optional[float] = None,
+        pool_pre_ping: bool = False,
+        sqlite_pragmas: Optional[Dict[str, Any]] = None,
+    ):
+        self.name = name
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_recycle = pool_recycle
+        self.pool_timeout = pool_timeout
+        self.pool_pre_ping = pool_pre_ping
+        self.sqlite_pragmas = sqlite_pragmas or {}
+
+    def engine_kwargs(self, database_string: str) -> Dict[str, Any]:
+        """Keyword arguments for create_engine() that apply to this database."""
+        url = make_url(database_string)
+        kwargs: Dict[str, Any] = {}
+        if self.pool_pre_ping:
+            kwargs["pool_pre_ping"] = True
+        if self.pool_recycle is not None:
+            kwargs["pool_recycle"] = self.pool_recycle
+        # In-memory SQLite uses a single connection per thread, which takes no pool sizing.
+        if not _is_memory_sqlite(url):
+            for option in ("pool_size", "max_overflow", "pool_timeout"):
+                value = getattr(self, option)
+                if value is not None:
+                    kwargs[option] = value
+        return kwargs
+
+    def __repr__(self) -> str:
+        return f"EngineProfile({self.name!r})"
+
+
+ENGINE_PROFILES: Dict[str, EngineProfile] = {
+    "baseline": EngineProfile("baseline"),
+    "tuned": EngineProfile(
+        "tuned",
+        pool_size=10,
+        max_overflow=20,
+        pool_recycle=1800,
+        pool_timeout=30,
+        pool_pre_ping=True,
+        sqlite_pragmas=SQLITE_TUNED_PRAGMAS,
+    ),
+}
+
+
+def get_engine_profile(profile=None) -> EngineProfile:
+    if profile is None:
+        profile = DEFAULT_ENGINE_PROFILE
+    if isinstance(profile, EngineProfile):
+        return profile
+    try:
+        return ENGINE_PROFILES[profile.lower()]
+    except KeyError:
+        raise ValueError(
+            f"Unknown engine profile: {profile}. Available profiles: {', '.join(ENGINE_PROFILES)}")
+
+
+def is_async_database(database_string: str) -> bool:
+    """Whether the database string names an asyncio driver."""
+    return bool(getattr(make_url(database_string).get_dialect(), "is_async", False))
+
+
+def _is_sqlite(url) -> bool:
+    return url.get_backend_name() == "sqlite"
+
+
+def _is_memory_sqlite(url) -> bool:
+    return _is_sqlite(url) and url.database in (None, "", ":memory:")
+
+
+def apply_sqlite_pragmas(engine: Engine, pragmas: Dict[str, Any]):
+    """Run the given PRAGMAs on every new DBAPI connection of the engine."""
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma, value in pragmas.items():
+                cursor.execute(f"PRAGMA {pragma}={value}")
+        finally:
+            cursor.close()
+
+
+def create_profiled_engine(database_string: str, profile=None, **overrides) -> Engine | AsyncEngine:
+    profile = get_engine_profile(profile)
+    kwargs = profile.engine_kwargs(database_string)
+    kwargs.update(overrides)
+    if is_async_database(database_string):
+        engine = create_async_engine(database_string, **kwargs)
+        sync_engine = engine.sync_engine
+    else:
+        engine = sync_engine = create_engine(database_string, **kwargs)
+
+    url = make_url(database_string)
+    if _is_sqlite(url) and not _is_memory_sqlite(url):
+        # Connect events are dispatched by the sync engine underneath an AsyncEngine
+        apply_sqlite_pragmas(sync_engine, profile.sqlite_pragmas)
+    LOG.debug(f"Created engine for {url.get_backend_name()} with profile '{profile.name}'")
+    return engine
@@ -0,0 +1,162 @@
+import asyncio
+import itertools
+import threading
+from enum import Enum
+from typing import Any, Awaitable, Callable, NamedTuple, Optional
+
+from utils.background_worker import STOP, BackgroundWorker, FlushMarker
+from utils.poly_logger import PolyLogger
+
+LOG = PolyLogger(__name__)
+
+"""
+The EventDispatcher moves observer fan-out off the agent hot path.
+Wrapped agent methods only enqueue a small EventRecord; a dedicated thread that owns
+its own event loop drains the records in order and awaits the observers.
+"""
+
+
+class BackpressurePolicy(Enum):
+    DROP = "drop"
+    BLOCK = "block"
+    SAMPLE = "sample"
+
+
+class EventRecord(NamedTuple):
+    notify: Callable[[str, Any], Awaitable[None]]
+    event: str
+    data: Any
+
+
+class EventDispatcher(BackgroundWorker):
+    """
+    Bounded, ordered dispatch of monitor events on a background thread.
+
+    - DROP: events submitted while the queue is full are discarded.
+    - BLOCK: the producer waits for a free slot (up to block_timeout seconds).
+    - SAMPLE: once the queue is past half capacity only every `sample_every`-th
+      event is kept; events that still find the queue full are discarded.
+    """
+
+    def __init__(
+        self,
+        max_queue_size: int = 1000,
+        policy: BackpressurePolicy | str = BackpressurePolicy.DROP,
+        sample_every: int = 10,
+        block_timeout: Optional[float] = None,
+        name: str = "polygpt-event-dispatcher",
+    ):
+        super().__init__(name)
+        self.max_queue_size = max_queue_size
+        self.policy = BackpressurePolicy(policy)
+        self.sample_every = max(1, sample_every)
+        self.block_timeout = block_timeout
+
+        self._slots = threading.BoundedSemaphore(max_queue_size)
+        self._sample_threshold = max(1, max_queue_size // 2)
+        self._sample_counter = itertools.count()
+        self._pending = 0
+        self._queue: Optional[asyncio.Queue] = None
+
+        self.enqueued = 0
+        self.dispatched = 0
+        self.dropped = 0
+        self.failed = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def submit(self, notify: Callable[[str, Any], Awaitable[None]], event: str, data: Any) -> bool:
+        """Enqueue an event for background delivery. Returns False if it was dropped."""
+        if self._thread is None:
+            self.start()
+        if not self.running:
+            self._count_drop()
+            return False
+
+        if self.policy is BackpressurePolicy.SAMPLE and self._pending >= self._sample_threshold:
+            if next(self._sample_counter) % self.sample_every:
+                self._count_drop()
+                return False
+
+        if self.policy is BackpressurePolicy.BLOCK and not self._in_worker_thread():
+            timeout = -1 if self.block_timeout is None else self.block_timeout
+            acquired = self._slots.acquire(timeout=timeout)
+        else:
+            acquired = self._slots.acquire(blocking=False)
+
+        if not acquired:
+            self._count_drop()
+            return False
+
+        if self._offer(EventRecord(notify, event, data)):
+            return True
+        self._count_drop()
+        self._slots.release()
+        return False
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every event submitted so far has been delivered."""
+        flushed = super().flush(timeout)
+        if not flushed and not self._in_worker_thread():
+            LOG.warning(
+                f"EventDispatcher flush timed out with {self._pending} events pending")
+        return flushed
+
+    def stop(self, timeout: Optional[float] = None):
+        """Deliver what is queued and end the thread. Events submitted afterwards are dropped."""
+        self.flush(timeout)
+        super().stop(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "policy": self.policy.value,
+            "max_queue_size": self.max_queue_size,
+            "pending": self._pending,
+            "enqueued": self.enqueued,
+            "dispatched": self.dispatched,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    def _count_drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    def _prepare(self):
+        self._queue = asyncio.Queue()
+
+    def _enqueue(self, record: EventRecord):
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, record)
+        self._pending += 1
+        self.enqueued += 1
+
+    def _enqueue_control(self, item: Any):
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+
+    async def _work(self):
+        while True:
+            record = await self._queue.get()
+            if record is STOP:
+                return
+            if isinstance(record, FlushMarker):
+                # Fire-and-forget observer deliveries also run on this loop.
+                background = [task for task in asyncio.all_tasks()
+                              if task is not asyncio.current_task()]
+                if background:
+                    await asyncio.wait(background)
+                record.done.set()
+                continue
+
+            try:
+                await record.notify(record.event, record.data)
+                self.dispatched += 1
+            except Exception as e:
+                self.failed += 1
+                LOG.error(
+                    f"EventDispatcher failed to deliver event '{record.event}': {e}")
+            finally:
+                with self._lock:
+                    self._pending -= 1
+                self._slots.release()
@@ -0,0 +1,178 @@
+import json
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+from utils.event_payload import payload_json_default
+from utils.poly_logger import PolyLogger
+
+LOG = PolyLogger(__name__)
+
+"""
+Append-only, per-task event log stored in the Workspace as JSON Lines segments.
+
+    <task_id>/events/segment-000001.jsonl   one JSON event per line, rotated by size
+    <task_id>/events/index.jsonl            sparse offset index: {"seq", "segment", "offset"}
+
+Every event gets a sequence number. An index entry is written at the start of each
+segment and every `index_interval` events, so reading event N only scans forward
+from the nearest indexed offset instead of from the beginning of the log.
+"""
+
+DEFAULT_SEGMENT_BYTES = 8 * 1024 * 1024
+DEFAULT_INDEX_INTERVAL = 64
+READ_CHUNK_BYTES = 64 * 1024
+
+
+def _read_lines(stream, chunk_size: int = READ_CHUNK_BYTES) -> Iterator[bytes]:
+    """Lines of a binary stream read in chunks (compressed workspace readers have no readline)."""
+    rest = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (rest + chunk).split(b"\n")
+        rest = lines.pop()
+        yield from lines
+    if rest:
+        yield rest
+
+
+class _LogState:
+    __slots__ = ("next_seq", "segment", "segment_size", "since_index")
+
+    def __init__(self, next_seq=0, segment=1, segment_size=0, since_index=0):
+        self.next_seq = next_seq
+        self.segment = segment
+        self.segment_size = segment_size
+        self.since_index = since_index
+
+
+class TaskEventLog:
+    def __init__(
+        self,
+        workspace,
+        directory: str = "events",
+        segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+        index_interval: int = DEFAULT_INDEX_INTERVAL,
+    ):
+        self.workspace = workspace
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.index_interval = index_interval
+        self._states: Dict[str, _LogState] = {}
+        self._lock = threading.Lock()
+
+    def segment_path(self, segment: int) -> str:
+        return f"{self.directory}/segment-{segment:06d}.jsonl"
+
+    @property
+    def index_path(self) -> str:
+        return f"{self.directory}/index.jsonl"
+
+    def append(self, task_id: str, events: List[Dict[str, Any]]) -> int:
+        """Append events for a task in one write per segment. Returns the number written."""
+        written = 0
+        with self._lock:
+            state = self._state(task_id)
+            lines: List[bytes] = []
+            index_entries: List[tuple] = []
+            pending_size = 0
+
+            for event in events:
+                try:
+                    line = json.dumps(
+                        {"seq": state.next_seq, **event}, default=payload_json_default
+                    ).encode("utf-8") + b"\n"
+                except (TypeError, ValueError, RuntimeError) as e:
+                    LOG.error(f"Failed to serialize event for task {task_id}: {e}")
+                    continue
+
+                if state.segment_size + pending_size and \
+                        state.segment_size + pending_size + len(line) > self.segment_bytes:
+                    self._write_segment(task_id, state, lines, index_entries)
+                    lines, index_entries, pending_size = [], [], 0
+                    state.segment += 1
+                    state.segment_size = 0
+
+                if state.segment_size + pending_size == 0 or state.since_index >= self.index_interval:
+                    index_entries.append((state.next_seq, pending_size))
+                    state.since_index = 0
+
+                lines.append(line)
+                pending_size += len(line)
+                state.next_seq += 1
+                state.since_index += 1
+                written += 1
+
+            if lines:
+                self._write_segment(task_id, state, lines, index_entries)
+        return written
+
+    def replay(self, task_id: str, start_seq: int = 0) -> Iterator[Dict[str, Any]]:
+        """Yield the events of a task in order, starting at sequence number start_seq."""
+        segment, offset = 1, 0
+        for entry in self._read_index(task_id):
+            if entry["seq"] > start_seq:
+                break
+            segment, offset = entry["segment"], entry["offset"]
+
+        while self.workspace.exists(task_id, self.segment_path(segment)):
+            # Only the part after the indexed offset is read, one chunk at a time
+            with self.workspace.open_read(task_id, self.segment_path(segment)) as f:
+                f.seek(offset)
+                for line in _read_lines(f):
+                    if not line:
+                        continue
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final line from an interrupted write
+                        LOG.warning(f"Skipping unreadable event line in {self.segment_path(segment)} of task {task_id}")
+                        continue
+                    if event["seq"] >= start_seq:
+                        yield event
+            segment, offset = segment + 1, 0
+
+    def read_event(self, task_id: str, seq: int) -> Optional[Dict[str, Any]]:
+        for event in self.replay(task_id, seq):
+            return event if event["seq"] == seq else None
+        return None
+
+    def _write_segment(self, task_id: str, state: _LogState, lines: List[bytes], index_entries: List[tuple]):
+        offset = self.workspace.append(task_id, self.segment_path(state.segment), b"".join(lines))
+        state.segment_size = offset + sum(len(line) for line in lines)
+        if index_entries:
+            index_lines = [
+                json.dumps({"seq": seq, "segment": state.segment, "offset": offset + relative})
+                for seq, relative in index_entries
+            ]
+            self.workspace.append(task_id, self.index_path, ("\n".join(index_lines) + "\n").encode("utf-8"))
+
+    def _read_index(self, task_id: str) -> List[Dict[str, int]]:
+        if not self.workspace.exists(task_id, self.index_path):
+            return []
+        data = self.workspace.read(task_id, self.index_path)
+        return [json.loads(line) for line in data.splitlines() if line]
+
+    def _state(self, task_id: str) -> _LogState:
+        state = self._states.get(task_id)
+        if state is None:
+            state = self._states[task_id] = self._recover_state(task_id)
+        return state
+
+    def _recover_state(self, task_id: str) -> _LogState:
+        """Rebuild the write position of a log written by an earlier process."""
+        index = self._read_index(task_id)
+        if not index:
+            return _LogState()
+        last = index[-1]
+        with self.workspace.open_read(task_id, self.segment_path(last["segment"])) as f:
+            f.seek(last["offset"])
+            tail = sum(1 for line in _read_lines(f) if line)
+            segment_size = f.tell()
+        return _LogState(
+            next_seq=last["seq"] + tail,
+            segment=last["segment"],
+            segment_size=segment_size,
+            since_index=tail,
+        )
@@ -0,0 +1,150 @@
+from typing import Any, Dict, Tuple
+
+"""
+EventPayload wraps the (args, kwargs) of a monitored agent call without formatting
+them. Observers that need the content call `render()`, which produces a JSON-friendly
+structure trimmed to a byte budget; everyone else only pays for a shallow snapshot.
+Top-level list, dict and tuple arguments are copied when the payload is created, so a
+later render shows them as they were at call time. A long list is cut to the items a
+render within the budget could reach (the newest messages of a conversation history),
+so the cost does not grow with the history. Nested objects are still shared.
+"""
+
+DEFAULT_PAYLOAD_BUDGET = 4096
+_MAX_DEPTH = 6
+_TRUNCATION_NOTE_SIZE = 40
+# Every rendered list item costs at least this many bytes, so a budget of max_bytes
+# never shows more than max_bytes // _MIN_ITEM_SIZE + 1 items of one list
+_MIN_ITEM_SIZE = 4
+
+
+def _is_message_list(value) -> bool:
+    return bool(value) and isinstance(value[-1], dict) and "content" in value[-1]
+
+
+class _Window(list):
+    """The part of a longer list that a render can reach, and how many items were cut."""
+
+    __slots__ = ("omitted", "newest_first")
+
+    def __init__(self, items, omitted: int, newest_first: bool):
+        super().__init__(items)
+        self.omitted = omitted
+        self.newest_first = newest_first
+
+
+def _describe_object(value) -> str:
+    name = getattr(value, "name", None)
+    if isinstance(name, str):
+        return f"<{type(value).__name__} {name}>"
+    return f"<{type(value).__name__}>"
+
+
+def _shrink(value: Any, budget: int, depth: int = 0) -> Tuple[Any, int]:
+    """Return a trimmed, JSON-friendly copy of value and its approximate size in bytes."""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value, 8
+    if isinstance(value, str):
+        if len(value) + 2 <= budget:
+            return value, len(value) + 2
+        keep = max(0, budget - _TRUNCATION_NOTE_SIZE)
+        return f"{value[:keep]}... [{len(value) - keep} chars truncated]", max(budget, _TRUNCATION_NOTE_SIZE)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<{len(value)} bytes>", 16
+    if depth >= _MAX_DEPTH:
+        return _describe_object(value), 16
+
+    if isinstance(value, dict):
+        rendered, used = {}, 2
+        for index, (key, item) in enumerate(value.items()):
+            if used >= budget:
+                rendered["..."] = f"{len(value) - index} more keys"
+                break
+            key = str(key)
+            rendered[key], size = _shrink(item, budget - used - len(key), depth + 1)
+            used += size + len(key) + 4
+        return rendered, used
+
+    if isinstance(value, (list, tuple)):
+        # Conversation histories keep their most recent messages, anything else its head.
+        newest_first = getattr(value, "newest_first", None)
+        if newest_first is None:
+            newest_first = _is_message_list(value)
+        items = reversed(value) if newest_first else value
+        rendered, used = [], 2
+        for item in items:
+            if used >= budget:
+                break
+            shrunk, size = _shrink(item, budget - used, depth + 1)
+            rendered.append(shrunk)
+            used += size + 2
+        omitted = len(value) - len(rendered) + getattr(value, "omitted", 0)
+        if newest_first:
+            rendered.reverse()
+            if omitted:
+                rendered.insert(0, {"omitted_messages": omitted})
+        elif omitted:
+            rendered.append(f"... {omitted} more items")
+        return rendered, used
+
+    return _describe_object(value), 16
+
+
+def _snapshot(value: Any, max_items: int) -> Any:
+    """Shallow copy of a container argument, so items added after the call are not seen."""
+    if isinstance(value, list):
+        if len(value) <= max_items:
+            return list(value)
+        # Only the end render() starts from is kept: the newest messages, or the head
+        newest_first = _is_message_list(value)
+        items = value[-max_items:] if newest_first else value[:max_items]
+        return _Window(items, len(value) - max_items, newest_first)
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, tuple):
+        return tuple(_snapshot(item, max_items) for item in value)
+    return value
+
+
+class EventPayload:
+    """
+    Lazily rendered, size-bounded view over the arguments of a monitored call.
+    Top-level list, dict and tuple arguments are copied (shallowly) when the payload
+    is created, long lists only as far as a render within max_bytes could reach.
+    """
+
+    __slots__ = ("args", "kwargs", "max_bytes", "_rendered")
+
+    def __init__(self, args: tuple, kwargs: Dict[str, Any], max_bytes: int = DEFAULT_PAYLOAD_BUDGET):
+        max_items = max_bytes // _MIN_ITEM_SIZE + 1
+        self.args = tuple(_snapshot(arg, max_items) for arg in args)
+        self.kwargs = {key: _snapshot(value, max_items) for key, value in kwargs.items()}
+        self.max_bytes = max_bytes
+        self._rendered = None
+
+    def render(self) -> Dict[str, Any]:
+        """Render args and kwargs into a JSON-friendly dict trimmed to max_bytes."""
+        if self._rendered is None:
+            args, used = _shrink(self.args, self.max_bytes)
+            kwargs, _ = _shrink(self.kwargs, max(0, self.max_bytes - used))
+            self._rendered = {"args": args, "kwargs": kwargs}
+        return self._rendered
+
+    def summary(self) -> str:
+        """A constant-cost description that never formats the argument values."""
+        return f"{len(self.args)} args, kwargs: {sorted(self.kwargs)}"
+
+    def __iter__(self):
+        # Keeps `args, kwargs = data['data']` working for existing observers.
+        yield self.args
+        yield self.kwargs
+
+    def __repr__(self) -> str:
+        return f"EventPayload({self.summary()})"
+
+
+def payload_json_default(value: Any) -> Any:
+    """`default=` hook for json.dumps that renders payloads instead of stringifying them."""
+    if isinstance(value, EventPayload):
+        return value.render()
+    return str(value)
@@ -0,0 +1,208 @@
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from utils.poly_logger import PolyLogger
+
+LOG = PolyLogger(__name__)
+
+"""
+In-process metrics for the agent hot path.
+LatencyHistogram is a log-linear (HDR-style) histogram over microseconds with ~1.6%
+relative error, cheap enough to update on every wrapped agent call. LatencyRegistry
+keeps one set of histograms per (agent, method) and exports them as a snapshot dict
+or in the Prometheus text format, served by start_metrics_server.
+"""
+
+_SUB_BUCKET_BITS = 7
+_SUB_BUCKET_COUNT = 1 << _SUB_BUCKET_BITS
+_SUB_BUCKET_HALF = _SUB_BUCKET_COUNT >> 1
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _bucket_index(value: int) -> int:
+    if value < _SUB_BUCKET_COUNT:
+        return value
+    shift = value.bit_length() - _SUB_BUCKET_BITS
+    return _SUB_BUCKET_COUNT + (shift - 1) * _SUB_BUCKET_HALF + ((value >> shift) - _SUB_BUCKET_HALF)
+
+
+def _bucket_value(index: int) -> int:
+    """Upper bound (in microseconds) of the values counted in a bucket."""
+    if index < _SUB_BUCKET_COUNT:
+        return index
+    shift, offset = divmod(index - _SUB_BUCKET_COUNT, _SUB_BUCKET_HALF)
+    shift += 1
+    return ((offset + _SUB_BUCKET_HALF + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """Log-linear histogram of durations, recorded in seconds and stored in microseconds."""
+
+    def __init__(self):
+        self.buckets = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        seconds = max(0.0, seconds)
+        self.buckets[_bucket_index(int(seconds * 1_000_000))] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, quantile: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = quantile * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(_bucket_value(index) / 1_000_000, self.max)
+        return self.max
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "min": self.min or 0.0,
+            "max": self.max,
+            **{f"p{int(q * 100)}": self.percentile(q) for q in QUANTILES},
+        }
+
+
+class MethodStats:
+    def __init__(self):
+        self.wall = LatencyHistogram()
+        self.cpu = LatencyHistogram()
+        # Time spent in the monitor itself (payload capture and event hand-off)
+        self.overhead = LatencyHistogram()
+        self.calls = 0
+        self.errors = Counter()
+
+
+class LatencyRegistry:
+    """
+    Per-agent, per-method latency histograms for monitored agent calls. A registry with
+    a parent also records every call there, so a per-instance registry can feed the
+    process-wide one that is exported.
+    """
+
+    def __init__(self, namespace: str = "polygpt_agent_method", parent: "LatencyRegistry" = None):
+        self.namespace = namespace
+        self.parent = parent
+        self._stats: Dict[Tuple[str, str], MethodStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, agent: str, method: str, wall_seconds: float, cpu_seconds: float,
+               error: Optional[BaseException] = None, overhead_seconds: Optional[float] = None):
+        key = (agent, method)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = MethodStats()
+            stats.calls += 1
+            stats.wall.record(wall_seconds)
+            stats.cpu.record(cpu_seconds)
+            if overhead_seconds is not None:
+                stats.overhead.record(overhead_seconds)
+            if error is not None:
+                stats.errors[type(error).__name__] += 1
+        if self.parent is not None:
+            self.parent.record(agent, method, wall_seconds, cpu_seconds, error, overhead_seconds)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, dict]]:
+        result: Dict[str, Dict[str, dict]] = {}
+        with self._lock:
+            for (agent, method), stats in sorted(self._stats.items()):
+                result.setdefault(agent, {})[method] = {
+                    "calls": stats.calls,
+                    "errors": dict(stats.errors),
+                    "wall": stats.wall.snapshot(),
+                    "cpu": stats.cpu.snapshot(),
+                    "overhead": stats.overhead.snapshot(),
+                }
+        return result
+
+    def to_prometheus(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            items = sorted(self._stats.items())
+            for kind in ("wall", "cpu", "overhead"):
+                name = f"{self.namespace}_{kind}_seconds"
+                lines.append(f"# TYPE {name} summary")
+                for (agent, method), stats in items:
+                    histogram = getattr(stats, kind)
+                    labels = f'agent="{_escape(agent)}",method="{_escape(method)}"'
+                    for q in QUANTILES:
+                        lines.append(
+                            f'{name}{{{labels},quantile="{q}"}} {histogram.percentile(q):.6f}')
+                    lines.append(f"{name}_sum{{{labels}}} {histogram.total:.6f}")
+                    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+            name = f"{self.namespace}_errors_total"
+            lines.append(f"# TYPE {name} counter")
+            for (agent, method), stats in items:
+                for exception, count in sorted(stats.errors.items()):
+                    lines.append(
+                        f'{name}{{agent="{_escape(agent)}",method="{_escape(method)}",'
+                        f'exception="{_escape(exception)}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+LATENCY_METRICS = LatencyRegistry()
+
+_collectors: List = [LATENCY_METRICS]
+
+
+def register_collector(collector):
+    """Expose an object with a `to_prometheus()` method on the metrics endpoint."""
+    if collector not in _collectors:
+        _collectors.append(collector)
+
+
+def render_prometheus() -> str:
+    return "".join(collector.to_prometheus() for collector in _collectors)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int = 9464, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve /metrics in the Prometheus text format from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(
+        target=server.serve_forever, name="polygpt-metrics", daemon=True)
+    thread.start()
+    LOG.info(f"Metrics endpoint listening on http://{host}:{server.server_port}/metrics")
+    return server
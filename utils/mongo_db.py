@@ -4,10 +4,16 @@ It uses SQLite as the database and file store backend.
 IT IS NOT ADVISED TO USE THIS IN PRODUCTION!
 """
 
+import asyncio
+import base64
 import datetime
+import json
 import math
+import threading
+import time
 import uuid
-from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from sqlalchemy import (
     JSON,
@@ -15,19 +21,53 @@ from sqlalchemy import (
     Column,
     DateTime,
     ForeignKey,
+    Index,
     String,
-    create_engine,
+    and_,
+    func,
+    insert,
+    or_,
 )
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import DeclarativeBase, joinedload, relationship, sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import (
+    DeclarativeBase,
+    Query,
+    Session,
+    relationship,
+    selectinload,
+    sessionmaker,
+)
 
+from utils.cache import MISSING, LRUCache
+from utils.engine_profiles import (
+    EngineProfile,
+    create_profiled_engine,
+    is_async_database,
+)
 from utils.poly_logger import PolyLogger
 
 from .errors import NotFoundError
-from .schema import Artifact, Pagination, Status, Step, StepRequestBody, Task
+from .schema import (
+    Artifact,
+    CursorPagination,
+    Pagination,
+    Status,
+    Step,
+    StepRequestBody,
+    Task,
+)
 
 LOG = PolyLogger(__name__)
 
+# Threads used to offload blocking queries when the driver is synchronous
+DEFAULT_DB_WORKERS = 8
+# Seconds a total row count is reused by list_* before it is counted again
+DEFAULT_COUNT_TTL = 5.0
+# Entries per get_task/get_step/get_artifact cache, and seconds before they are re-read
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_CACHE_TTL = 30.0
+
 
 class Base(DeclarativeBase):
     pass
@@ -46,6 +86,8 @@ class TaskModel(Base):
 
     artifacts = relationship("ArtifactModel", back_populates="task")
 
+    __table_args__ = (Index("ix_tasks_created_at_task_id", "created_at", "task_id"),)
+
 
 class StepModel(Base):
     __tablename__ = "steps"
@@ -66,6 +108,8 @@ class StepModel(Base):
     additional_output = Column(JSON)
     artifacts = relationship("ArtifactModel", back_populates="step")
 
+    __table_args__ = (Index("ix_steps_task_id_created_at", "task_id", "created_at", "step_id"),)
+
 
 class ArtifactModel(Base):
     __tablename__ = "artifacts"
@@ -84,6 +128,43 @@ class ArtifactModel(Base):
     step = relationship("StepModel", back_populates="artifacts")
     task = relationship("TaskModel", back_populates="artifacts")
 
+    __table_args__ = (Index("ix_artifacts_task_id_created_at", "task_id", "created_at", "artifact_id"),)
+
+
+def create_schema(connection) -> None:
+    """
+    Create missing tables, then missing indexes: create_all() skips tables that
+    already exist, so indexes added to an existing table are created one by one.
+    """
+    Base.metadata.create_all(connection)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def encode_cursor(created_at: datetime.datetime, row_id: str) -> str:
+    """Opaque keyset cursor pointing just after the row (created_at, row_id)."""
+    raw = json.dumps({"t": created_at.isoformat(), "id": row_id}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(raw)
+        return datetime.datetime.fromisoformat(position["t"]), position["id"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid pagination cursor: {cursor!r}") from e
+
+
+def sequential_timestamps(count: int) -> List[datetime.datetime]:
+    """
+    Distinct, increasing created_at values for rows inserted in one statement, so
+    ordering by created_at keeps the order the rows were given in.
+    """
+    now = datetime.datetime.utcnow()
+    return [now + datetime.timedelta(microseconds=i) for i in range(count)]
+
 
 def convert_to_task(task_obj: TaskModel, debug_enabled: bool = False) -> Task:
     if debug_enabled:
@@ -125,6 +206,60 @@ def convert_to_step(step_model: StepModel, debug_enabled: bool = False) -> Step:
     )
 
 
+# Columns loaded in summary mode: no artifacts and no ORM objects, just row tuples
+TASK_SUMMARY_COLUMNS = (
+    TaskModel.task_id,
+    TaskModel.input,
+    TaskModel.additional_input,
+    TaskModel.created_at,
+    TaskModel.modified_at,
+)
+STEP_SUMMARY_COLUMNS = (
+    StepModel.task_id,
+    StepModel.step_id,
+    StepModel.name,
+    StepModel.input,
+    StepModel.status,
+    StepModel.output,
+    StepModel.is_last,
+    StepModel.additional_input,
+    StepModel.additional_output,
+    StepModel.created_at,
+    StepModel.modified_at,
+)
+
+
+def task_summary(row) -> Task:
+    """Task from a TASK_SUMMARY_COLUMNS row, with an empty artifact list."""
+    return Task(
+        task_id=row.task_id,
+        created_at=row.created_at,
+        modified_at=row.modified_at,
+        input=row.input,
+        additional_input=row.additional_input,
+        artifacts=[],
+    )
+
+
+def step_summary(row) -> Step:
+    """Step from a STEP_SUMMARY_COLUMNS row, with an empty artifact list."""
+    status = Status.completed if row.status == "completed" else Status.created
+    return Step(
+        task_id=row.task_id,
+        step_id=row.step_id,
+        created_at=row.created_at,
+        modified_at=row.modified_at,
+        name=row.name,
+        input=row.input,
+        status=status,
+        output=row.output,
+        artifacts=[],
+        is_last=row.is_last == 1,
+        additional_input=row.additional_input,
+        additional_output=row.additional_output,
+    )
+
+
 def convert_to_artifact(artifact_model: ArtifactModel) -> Artifact:
     return Artifact(
         artifact_id=artifact_model.artifact_id,
@@ -136,17 +271,176 @@ def convert_to_artifact(artifact_model: ArtifactModel) -> Artifact:
     )
 
 
-# sqlite:///{database_name}
+# sqlite:///{database_name}, or sqlite+aiosqlite:///{database_name} for the async backend
 class AgentDB:
-    def __init__(self, database_string, debug_enabled: bool = False) -> None:
+    """
+    Every public method is a coroutine. The database work itself is written once, as a
+    function of a synchronous Session, and `_run` executes it without blocking the
+    event loop: through AsyncSession.run_sync when the database string names an async
+    driver (aiosqlite, asyncpg, ...), or on a thread pool for synchronous drivers.
+    """
+
+    def __init__(
+        self,
+        database_string,
+        debug_enabled: bool = False,
+        engine_profile: EngineProfile | str | None = None,
+        executor: Optional[Executor] = None,
+        count_ttl: float = DEFAULT_COUNT_TTL,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        cache_ttl: Optional[float] = DEFAULT_CACHE_TTL,
+    ) -> None:
         super().__init__()
         self.debug_enabled = debug_enabled
         if self.debug_enabled:
             LOG.debug(
                 f"Initializing AgentDB with database_string: {database_string}")
-        self.engine = create_engine(database_string)
-        Base.metadata.create_all(self.engine)
-        self.Session = sessionmaker(bind=self.engine)
+        self.is_async = is_async_database(database_string)
+        self.engine = create_profiled_engine(database_string, engine_profile)
+        # (table name, task_id) -> (row count, monotonic expiry); 0 disables caching
+        self.count_ttl = count_ttl
+        self._counts: Dict[Tuple[str, Optional[str]], Tuple[int, float]] = {}
+        self._counts_lock = threading.Lock()
+        # Converted Task/Step/Artifact models by id. Cached models are shared between
+        # callers and must be treated as read-only; cache_size=0 disables caching.
+        self._task_cache = LRUCache("agentdb_task", cache_size, cache_ttl)
+        self._step_cache = LRUCache("agentdb_step", cache_size, cache_ttl)
+        self._artifact_cache = LRUCache("agentdb_artifact", cache_size, cache_ttl)
+        if self.is_async:
+            # Tables are created on first use, since this needs a running event loop.
+            self._schema_ready = False
+            self._schema_lock = asyncio.Lock()
+            self.Session = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+            self._executor = None
+        else:
+            with self.engine.begin() as connection:
+                create_schema(connection)
+            self._schema_ready = True
+            self.Session = sessionmaker(bind=self.engine)
+            self._executor = executor or ThreadPoolExecutor(
+                max_workers=DEFAULT_DB_WORKERS, thread_name_prefix="agentdb")
+
+    async def _run(self, operation: Callable[[Session], Any]) -> Any:
+        """Run operation(session) in a fresh session without blocking the event loop."""
+        if self.is_async:
+            if not self._schema_ready:
+                async with self._schema_lock:
+                    if not self._schema_ready:
+                        async with self.engine.begin() as connection:
+                            await connection.run_sync(create_schema)
+                        self._schema_ready = True
+            async with self.Session() as session:
+                return await session.run_sync(operation)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._run_in_session, operation)
+
+    def _run_in_session(self, operation: Callable[[Session], Any]) -> Any:
+        with self.Session() as session:
+            return operation(session)
+
+    async def run_in_session(self, operation: Callable[[Session], Any]) -> Any:
+        """
+        Run operation(session) in a fresh session, through run_sync for async drivers or
+        on the executor otherwise. For maintenance jobs such as retention that work across
+        tables; the operation commits its own changes.
+        """
+        return await self._run(operation)
+
+    def _count(self, session: Session, model, task_id: Optional[str] = None) -> int:
+        """Row count of model (for one task), reused for count_ttl seconds."""
+        key = (model.__tablename__, task_id)
+        now = time.monotonic()
+        with self._counts_lock:
+            cached = self._counts.get(key)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        query = session.query(func.count()).select_from(model)
+        if task_id is not None:
+            query = query.filter(model.task_id == task_id)
+        total = query.scalar()
+        if self.count_ttl > 0:
+            with self._counts_lock:
+                self._counts[key] = (total, now + self.count_ttl)
+        return total
+
+    def _invalidate_count(self, model, task_id: Optional[str] = None) -> None:
+        with self._counts_lock:
+            self._counts.pop((model.__tablename__, task_id), None)
+
+    def _keyset_page(
+        self,
+        session: Session,
+        model,
+        id_column,
+        cursor: Optional[str],
+        per_page: int,
+        task_id: Optional[str] = None,
+        query: Optional[Query] = None,
+    ) -> Tuple[list, Optional[str]]:
+        """
+        Rows ordered by (created_at, id) that come after the cursor, using the
+        (task_id, created_at) index instead of scanning past an OFFSET. `query`
+        replaces the default session.query(model), e.g. to select summary columns.
+        """
+        if query is None:
+            query = session.query(model)
+        if task_id is not None:
+            query = query.filter(model.task_id == task_id)
+        if cursor:
+            created_at, row_id = decode_cursor(cursor)
+            query = query.filter(
+                or_(
+                    model.created_at > created_at,
+                    and_(model.created_at == created_at, id_column > row_id),
+                )
+            )
+        rows = query.order_by(model.created_at, id_column).limit(per_page + 1).all()
+        if len(rows) <= per_page:
+            return rows, None
+        rows = rows[:per_page]
+        last = rows[-1]
+        return rows, encode_cursor(last.created_at, getattr(last, id_column.key))
+
+    def cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            "task": self._task_cache.stats(),
+            "step": self._step_cache.stats(),
+            "artifact": self._artifact_cache.stats(),
+        }
+
+    def clear_caches(self) -> None:
+        """Forget cached lookups and counts, e.g. after rows were deleted behind AgentDB's back."""
+        self._task_cache.clear()
+        self._step_cache.clear()
+        self._artifact_cache.clear()
+        with self._counts_lock:
+            self._counts.clear()
+
+    def _task_query(self, session: Session, summary: bool = False) -> Query:
+        if summary:
+            return session.query(*TASK_SUMMARY_COLUMNS)
+        # One extra IN query loads the artifacts of the whole page
+        return session.query(TaskModel).options(selectinload(TaskModel.artifacts))
+
+    def _step_query(self, session: Session, summary: bool = False) -> Query:
+        if summary:
+            return session.query(*STEP_SUMMARY_COLUMNS)
+        return session.query(StepModel).options(selectinload(StepModel.artifacts))
+
+    def _convert_task(self, row, summary: bool = False) -> Task:
+        return task_summary(row) if summary else convert_to_task(row, self.debug_enabled)
+
+    def _convert_step(self, row, summary: bool = False) -> Step:
+        return step_summary(row) if summary else convert_to_step(row, self.debug_enabled)
+
+    async def close(self) -> None:
+        """Dispose of the engine's connections and stop the offload threads."""
+        if self.is_async:
+            await self.engine.dispose()
+        else:
+            self.engine.dispose()
+            self._executor.shutdown(wait=False)
 
     async def create_task(
         self, input: Optional[str], additional_input: Optional[dict] = None
@@ -154,20 +448,23 @@ class AgentDB:
         if self.debug_enabled:
             LOG.debug("Creating new task")
 
+        def create(session: Session) -> Task:
+            new_task = TaskModel(
+                task_id=str(uuid.uuid4()),
+                input=input,
+                additional_input=additional_input if additional_input else {},
+            )
+            session.add(new_task)
+            session.commit()
+            session.refresh(new_task)
+            self._invalidate_count(TaskModel)
+            if self.debug_enabled:
+                LOG.debug(
+                    f"Created new task with task_id: {new_task.task_id}")
+            return convert_to_task(new_task, self.debug_enabled)
+
         try:
-            with self.Session() as session:
-                new_task = TaskModel(
-                    task_id=str(uuid.uuid4()),
-                    input=input,
-                    additional_input=additional_input if additional_input else {},
-                )
-                session.add(new_task)
-                session.commit()
-                session.refresh(new_task)
-                if self.debug_enabled:
-                    LOG.debug(
-                        f"Created new task with task_id: {new_task.task_id}")
-                return convert_to_task(new_task, self.debug_enabled)
+            return await self._run(create)
         except SQLAlchemyError as e:
             LOG.error(f"SQLAlchemy error while creating task: {e}")
             raise
@@ -187,24 +484,28 @@ class AgentDB:
     ) -> Step:
         if self.debug_enabled:
             LOG.debug(f"Creating new step for task_id: {task_id}")
+
+        def create(session: Session) -> Step:
+            new_step = StepModel(
+                task_id=task_id,
+                step_id=str(uuid.uuid4()),
+                name=input.input,
+                input=input.input,
+                status="created",
+                is_last=is_last,
+                additional_input=additional_input,
+            )
+            session.add(new_step)
+            session.commit()
+            session.refresh(new_step)
+            self._invalidate_count(StepModel, task_id)
+            if self.debug_enabled:
+                LOG.debug(
+                    f"Created new step with step_id: {new_step.step_id}")
+            return convert_to_step(new_step, self.debug_enabled)
+
         try:
-            with self.Session() as session:
-                new_step = StepModel(
-                    task_id=task_id,
-                    step_id=str(uuid.uuid4()),
-                    name=input.input,
-                    input=input.input,
-                    status="created",
-                    is_last=is_last,
-                    additional_input=additional_input,
-                )
-                session.add(new_step)
-                session.commit()
-                session.refresh(new_step)
-                if self.debug_enabled:
-                    LOG.debug(
-                        f"Created new step with step_id: {new_step.step_id}")
-                return convert_to_step(new_step, self.debug_enabled)
+            return await self._run(create)
         except SQLAlchemyError as e:
             LOG.error(f"SQLAlchemy error while creating step: {e}")
             raise
@@ -215,6 +516,54 @@ class AgentDB:
             LOG.error(f"Unexpected error while creating step: {e}")
             raise
 
+    async def create_steps_bulk(
+        self,
+        task_id: str,
+        inputs: List[StepRequestBody],
+        is_last: bool = False,
+        additional_input: Optional[Dict[str, Any]] = None,
+    ) -> List[str]:
+        """
+        Insert one step per input in a single executemany statement and transaction.
+        Returns the new step ids in input order; rows are not loaded back.
+        """
+        if not inputs:
+            return []
+        if self.debug_enabled:
+            LOG.debug(f"Creating {len(inputs)} steps for task_id: {task_id}")
+
+        step_ids = [str(uuid.uuid4()) for _ in inputs]
+        rows = [
+            {
+                "task_id": task_id,
+                "step_id": step_id,
+                "name": step_input.input,
+                "input": step_input.input,
+                "status": "created",
+                "is_last": is_last,
+                "additional_input": additional_input or {},
+                "created_at": created_at,
+                "modified_at": created_at,
+            }
+            for step_id, step_input, created_at in zip(
+                step_ids, inputs, sequential_timestamps(len(inputs)))
+        ]
+
+        def create(session: Session) -> List[str]:
+            session.execute(insert(StepModel), rows)
+            session.commit()
+            self._invalidate_count(StepModel, task_id)
+            return step_ids
+
+        try:
+            return await self._run(create)
+        except SQLAlchemyError as e:
+            LOG.error(f"SQLAlchemy error while creating steps: {e}")
+            raise
+        except Exception as e:
+            LOG.error(f"Unexpected error while creating steps: {e}")
+            raise
+
     async def create_artifact(
         self,
         task_id: str,
@@ -225,40 +574,47 @@ class AgentDB:
     ) -> Artifact:
         if self.debug_enabled:
             LOG.debug(f"Creating new artifact for task_id: {task_id}")
-        try:
-            with self.Session() as session:
-                if (
-                    existing_artifact := session.query(ArtifactModel)
-                    .filter_by(
-                        task_id=task_id,
-                        file_name=file_name,
-                        relative_path=relative_path,
-                    )
-                    .first()
-                ):
-                    session.close()
-                    if self.debug_enabled:
-                        LOG.debug(
-                            f"Artifact already exists with relative_path: {relative_path}"
-                        )
-                    return convert_to_artifact(existing_artifact)
-
-                new_artifact = ArtifactModel(
-                    artifact_id=str(uuid.uuid4()),
+
+        def create(session: Session) -> Artifact:
+            if (
+                existing_artifact := session.query(ArtifactModel)
+                .filter_by(
                     task_id=task_id,
-                    step_id=step_id,
-                    agent_created=agent_created,
                     file_name=file_name,
                     relative_path=relative_path,
                 )
-                session.add(new_artifact)
-                session.commit()
-                session.refresh(new_artifact)
+                .first()
+            ):
                 if self.debug_enabled:
                     LOG.debug(
-                        f"Created new artifact with artifact_id: {new_artifact.artifact_id}"
+                        f"Artifact already exists with relative_path: {relative_path}"
                     )
-                return convert_to_artifact(new_artifact)
+                return convert_to_artifact(existing_artifact)
+
+            new_artifact = ArtifactModel(
+                artifact_id=str(uuid.uuid4()),
+                task_id=task_id,
+                step_id=step_id,
+                agent_created=agent_created,
+                file_name=file_name,
+                relative_path=relative_path,
+            )
+            session.add(new_artifact)
+            session.commit()
+            session.refresh(new_artifact)
+            self._invalidate_count(ArtifactModel, task_id)
+            # The task and step embed their artifact lists
+            self._task_cache.invalidate(task_id)
+            if step_id is not None:
+                self._step_cache.invalidate(step_id)
+            if self.debug_enabled:
+                LOG.debug(
+                    f"Created new artifact with artifact_id: {new_artifact.artifact_id}"
+                )
+            return convert_to_artifact(new_artifact)
+
+        try:
+            return await self._run(create)
         except SQLAlchemyError as e:
             LOG.error(f"SQLAlchemy error while creating step: {e}")
             raise
@@ -273,18 +629,27 @@ class AgentDB:
         """Get a task by its id"""
         if self.debug_enabled:
             LOG.debug(f"Getting task with task_id: {task_id}")
+
+        if (cached := self._task_cache.get(task_id)) is not MISSING:
+            return cached
+        generation = self._task_cache.generation(task_id)
+
+        def get(session: Session) -> Task:
+            if task_obj := (
+                session.query(TaskModel)
+                .options(selectinload(TaskModel.artifacts))
+                .filter_by(task_id=task_id)
+                .first()
+            ):
+                return convert_to_task(task_obj, self.debug_enabled)
+            else:
+                LOG.error(f"Task not found with task_id: {task_id}")
+                raise NotFoundError("Task not found")
+
         try:
-            with self.Session() as session:
-                if task_obj := (
-                    session.query(TaskModel)
-                    .options(joinedload(TaskModel.artifacts))
-                    .filter_by(task_id=task_id)
-                    .first()
-                ):
-                    return convert_to_task(task_obj, self.debug_enabled)
-                else:
-                    LOG.error(f"Task not found with task_id: {task_id}")
-                    raise NotFoundError("Task not found")
+            result = await self._run(get)
+            self._task_cache.put(task_id, result, generation)
+            return result
         except SQLAlchemyError as e:
             LOG.error(f"SQLAlchemy error while getting task: {e}")
             raise
@@ -299,21 +664,30 @@ class AgentDB:
         if self.debug_enabled:
             LOG.debug(
                 f"Getting step with task_id: {task_id} and step_id: {step_id}")
+
+        if (cached := self._step_cache.get(step_id)) is not MISSING:
+            return cached
+        generation = self._step_cache.generation(step_id)
+
+        def get(session: Session) -> Step:
+            if step := (
+                session.query(StepModel)
+                .options(selectinload(StepModel.artifacts))
+                .filter(StepModel.step_id == step_id)
+                .first()
+            ):
+                return convert_to_step(step, self.debug_enabled)
+
+            else:
+                LOG.error(
+                    f"Step not found with task_id: {task_id} and step_id: {step_id}"
+                )
+                raise NotFoundError("Step not found")
+
         try:
-            with self.Session() as session:
-                if step := (
-                    session.query(StepModel)
-                    .options(joinedload(StepModel.artifacts))
-                    .filter(StepModel.step_id == step_id)
-                    .first()
-                ):
-                    return convert_to_step(step, self.debug_enabled)
-
-                else:
-                    LOG.error(
-                        f"Step not found with task_id: {task_id} and step_id: {step_id}"
-                    )
-                    raise NotFoundError("Step not found")
+            result = await self._run(get)
+            self._step_cache.put(step_id, result, generation)
+            return result
         except SQLAlchemyError as e:
             LOG.error(f"SQLAlchemy error while getting step: {e}")
             raise
@@ -336,28 +710,32 @@ class AgentDB:
         if self.debug_enabled:
             LOG.debug(
                 f"Updating step with task_id: {task_id} and step_id: {step_id}")
+
+        def update(session: Session) -> None:
+            if (
+                step := session.query(StepModel)
+                .filter_by(task_id=task_id, step_id=step_id)
+                .first()
+            ):
+                if status is not None:
+                    step.status = status
+                if additional_input is not None:
+                    step.additional_input = additional_input
+                if output is not None:
+                    step.output = output
+                if additional_output is not None:
+                    step.additional_output = additional_output
+                session.commit()
+                self._step_cache.invalidate(step_id)
+            else:
+                LOG.error(
+                    f"Step not found for update with task_id: {task_id} and step_id: {step_id}"
+                )
+                raise NotFoundError("Step not found")
+
         try:
-            with self.Session() as session:
-                if (
-                    step := session.query(StepModel)
-                    .filter_by(task_id=task_id, step_id=step_id)
-                    .first()
-                ):
-                    if status is not None:
-                        step.status = status
-                    if additional_input is not None:
-                        step.additional_input = additional_input
-                    if output is not None:
-                        step.output = output
-                    if additional_output is not None:
-                        step.additional_output = additional_output
-                    session.commit()
-                    return await self.get_step(task_id, step_id)
-                else:
-                    LOG.error(
-                        f"Step not found for update with task_id: {task_id} and step_id: {step_id}"
-                    )
-                    raise NotFoundError("Step not found")
+            await self._run(update)
+            return await self.get_step(task_id, step_id)
         except SQLAlchemyError as e:
             LOG.error(f"SQLAlchemy error while getting step: {e}")
             raise
@@ -371,18 +749,27 @@ class AgentDB:
     async def get_artifact(self, artifact_id: str) -> Artifact:
         if self.debug_enabled:
             LOG.debug(f"Getting artifact with and artifact_id: {artifact_id}")
+
+        if (cached := self._artifact_cache.get(artifact_id)) is not MISSING:
+            return cached
+        generation = self._artifact_cache.generation(artifact_id)
+
+        def get(session: Session) -> Artifact:
+            if (
+                artifact_model := session.query(ArtifactModel)
+                .filter_by(artifact_id=artifact_id)
+                .first()
+            ):
+                return convert_to_artifact(artifact_model)
+            else:
+                LOG.error(
+                    f"Artifact not found with and artifact_id: {artifact_id}")
+                raise NotFoundError("Artifact not found")
+
         try:
-            with self.Session() as session:
-                if (
-                    artifact_model := session.query(ArtifactModel)
-                    .filter_by(artifact_id=artifact_id)
-                    .first()
-                ):
-                    return convert_to_artifact(artifact_model)
-                else:
-                    LOG.error(
-                        f"Artifact not found with and artifact_id: {artifact_id}")
-                    raise NotFoundError("Artifact not found")
+            result = await self._run(get)
+            self._artifact_cache.put(artifact_id, result, generation)
+            return result
         except SQLAlchemyError as e:
             LOG.error(f"SQLAlchemy error while getting artifact: {e}")
             raise
@@ -394,29 +781,33 @@ class AgentDB:
             raise
 
     async def list_tasks(
-        self, page: int = 1, per_page: int = 10
+        self, page: int = 1, per_page: int = 10, summary: bool = False
     ) -> Tuple[List[Task], Pagination]:
+        """With summary=True, tasks are built from plain columns and carry no artifacts."""
         if self.debug_enabled:
             LOG.debug("Listing tasks")
+
+        def list_page(session: Session) -> Tuple[List[Task], Pagination]:
+            tasks = (
+                self._task_query(session, summary)
+                .offset((page - 1) * per_page)
+                .limit(per_page)
+                .all()
+            )
+            total = self._count(session, TaskModel)
+            pages = math.ceil(total / per_page)
+            pagination = Pagination(
+                total_items=total,
+                total_pages=pages,
+                current_page=page,
+                page_size=per_page,
+            )
+            return [
+                self._convert_task(task, summary) for task in tasks
+            ], pagination
+
         try:
-            with self.Session() as session:
-                tasks = (
-                    session.query(TaskModel)
-                    .offset((page - 1) * per_page)
-                    .limit(per_page)
-                    .all()
-                )
-                total = session.query(TaskModel).count()
-                pages = math.ceil(total / per_page)
-                pagination = Pagination(
-                    total_items=total,
-                    total_pages=pages,
-                    current_page=page,
-                    page_size=per_page,
-                )
-                return [
-                    convert_to_task(task, self.debug_enabled) for task in tasks
-                ], pagination
+            return await self._run(list_page)
         except SQLAlchemyError as e:
             LOG.error(f"SQLAlchemy error while listing tasks: {e}")
             raise
@@ -427,32 +818,73 @@ class AgentDB:
             LOG.error(f"Unexpected error while listing tasks: {e}")
             raise
 
+    async def list_tasks_keyset(
+        self,
+        cursor: Optional[str] = None,
+        per_page: int = 10,
+        include_total: bool = False,
+        summary: bool = False,
+    ) -> Tuple[List[Task], CursorPagination]:
+        """
+        Page through tasks in creation order. Pass the returned next_cursor to get
+        the following page; it is None on the last page. summary=True skips artifacts.
+        """
+        if self.debug_enabled:
+            LOG.debug("Listing tasks by cursor")
+
+        def list_page(session: Session) -> Tuple[List[Task], CursorPagination]:
+            tasks, next_cursor = self._keyset_page(
+                session, TaskModel, TaskModel.task_id, cursor, per_page,
+                query=self._task_query(session, summary),
+            )
+            pagination = CursorPagination(
+                next_cursor=next_cursor,
+                page_size=per_page,
+                total_items=self._count(session, TaskModel) if include_total else None,
+            )
+            return [self._convert_task(task, summary) for task in tasks], pagination
+
+        try:
+            return await self._run(list_page)
+        except SQLAlchemyError as e:
+            LOG.error(f"SQLAlchemy error while listing tasks: {e}")
+            raise
+        except ValueError as e:
+            LOG.error(f"Invalid cursor while listing tasks: {e}")
+            raise
+        except Exception as e:
+            LOG.error(f"Unexpected error while listing tasks: {e}")
+            raise
+
     async def list_steps(
-        self, task_id: str, page: int = 1, per_page: int = 10
+        self, task_id: str, page: int = 1, per_page: int = 10, summary: bool = False
     ) -> Tuple[List[Step], Pagination]:
+        """With summary=True, steps are built from plain columns and carry no artifacts."""
         if self.debug_enabled:
             LOG.debug(f"Listing steps for task_id: {task_id}")
+
+        def list_page(session: Session) -> Tuple[List[Step], Pagination]:
+            steps = (
+                self._step_query(session, summary)
+                .filter(StepModel.task_id == task_id)
+                .offset((page - 1) * per_page)
+                .limit(per_page)
+                .all()
+            )
+            total = self._count(session, StepModel, task_id)
+            pages = math.ceil(total / per_page)
+            pagination = Pagination(
+                total_items=total,
+                total_pages=pages,
+                current_page=page,
+                page_size=per_page,
+            )
+            return [
+                self._convert_step(step, summary) for step in steps
+            ], pagination
+
         try:
-            with self.Session() as session:
-                steps = (
-                    session.query(StepModel)
-                    .filter_by(task_id=task_id)
-                    .offset((page - 1) * per_page)
-                    .limit(per_page)
-                    .all()
-                )
-                total = session.query(StepModel).filter_by(
-                    task_id=task_id).count()
-                pages = math.ceil(total / per_page)
-                pagination = Pagination(
-                    total_items=total,
-                    total_pages=pages,
-                    current_page=page,
-                    page_size=per_page,
-                )
-                return [
-                    convert_to_step(step, self.debug_enabled) for step in steps
-                ], pagination
+            return await self._run(list_page)
         except SQLAlchemyError as e:
             LOG.error(f"SQLAlchemy error while listing steps: {e}")
             raise
@@ -463,32 +895,73 @@ class AgentDB:
             LOG.error(f"Unexpected error while listing steps: {e}")
             raise
 
+    async def list_steps_keyset(
+        self,
+        task_id: str,
+        cursor: Optional[str] = None,
+        per_page: int = 10,
+        include_total: bool = False,
+        summary: bool = False,
+    ) -> Tuple[List[Step], CursorPagination]:
+        """
+        Page through steps in creation order. Pass the returned next_cursor to get
+        the following page; it is None on the last page. summary=True skips artifacts.
+        """
+        if self.debug_enabled:
+            LOG.debug(f"Listing steps by cursor for task_id: {task_id}")
+
+        def list_page(session: Session) -> Tuple[List[Step], CursorPagination]:
+            steps, next_cursor = self._keyset_page(
+                session, StepModel, StepModel.step_id, cursor, per_page, task_id,
+                query=self._step_query(session, summary),
+            )
+            pagination = CursorPagination(
+                next_cursor=next_cursor,
+                page_size=per_page,
+                total_items=self._count(session, StepModel, task_id) if include_total else None,
+            )
+            return [self._convert_step(step, summary) for step in steps], pagination
+
+        try:
+            return await self._run(list_page)
+        except SQLAlchemyError as e:
+            LOG.error(f"SQLAlchemy error while listing steps: {e}")
+            raise
+        except ValueError as e:
+            LOG.error(f"Invalid cursor while listing steps: {e}")
+            raise
+        except Exception as e:
+            LOG.error(f"Unexpected error while listing steps: {e}")
+            raise
+
     async def list_artifacts(
         self, task_id: str, page: int = 1, per_page: int = 10
     ) -> Tuple[List[Artifact], Pagination]:
         if self.debug_enabled:
             LOG.debug(f"Listing artifacts for task_id: {task_id}")
+
+        def list_page(session: Session) -> Tuple[List[Artifact], Pagination]:
+            artifacts = (
+                session.query(ArtifactModel)
+                .filter_by(task_id=task_id)
+                .offset((page - 1) * per_page)
+                .limit(per_page)
+                .all()
+            )
+            total = self._count(session, ArtifactModel, task_id)
+            pages = math.ceil(total / per_page)
+            pagination = Pagination(
+                total_items=total,
+                total_pages=pages,
+                current_page=page,
+                page_size=per_page,
+            )
+            return [
+                convert_to_artifact(artifact) for artifact in artifacts
+            ], pagination
+
         try:
-            with self.Session() as session:
-                artifacts = (
-                    session.query(ArtifactModel)
-                    .filter_by(task_id=task_id)
-                    .offset((page - 1) * per_page)
-                    .limit(per_page)
-                    .all()
-                )
-                total = session.query(ArtifactModel).filter_by(
-                    task_id=task_id).count()
-                pages = math.ceil(total / per_page)
-                pagination = Pagination(
-                    total_items=total,
-                    total_pages=pages,
-                    current_page=page,
-                    page_size=per_page,
-                )
-                return [
-                    convert_to_artifact(artifact) for artifact in artifacts
-                ], pagination
+            return await self._run(list_page)
         except SQLAlchemyError as e:
             LOG.error(f"SQLAlchemy error while listing artifacts: {e}")
             raise
@@ -498,3 +971,40 @@ class AgentDB:
         except Exception as e:
             LOG.error(f"Unexpected error while listing artifacts: {e}")
             raise
+
+    async def list_artifacts_keyset(
+        self,
+        task_id: str,
+        cursor: Optional[str] = None,
+        per_page: int = 10,
+        include_total: bool = False,
+    ) -> Tuple[List[Artifact], CursorPagination]:
+        """
+        Page through artifacts in creation order. Pass the returned next_cursor to get
+        the following page; it is None on the last page.
+        """
+        if self.debug_enabled:
+            LOG.debug(f"Listing artifacts by cursor for task_id: {task_id}")
+
+        def list_page(session: Session) -> Tuple[List[Artifact], CursorPagination]:
+            artifacts, next_cursor = self._keyset_page(
+                session, ArtifactModel, ArtifactModel.artifact_id, cursor, per_page, task_id
+            )
+            pagination = CursorPagination(
+                next_cursor=next_cursor,
+                page_size=per_page,
+                total_items=self._count(session, ArtifactModel, task_id) if include_total else None,
+            )
+            return [convert_to_artifact(artifact) for artifact in artifacts], pagination
+
+        try:
+            return await self._run(list_page)
+        except SQLAlchemyError as e:
+            LOG.error(f"SQLAlchemy error while listing artifacts: {e}")
+            raise
+        except ValueError as e:
+            LOG.error(f"Invalid cursor while listing artifacts: {e}")
+            raise
+        except Exception as e:
+            LOG.error(f"Unexpected error while listing artifacts: {e}")
+            raise
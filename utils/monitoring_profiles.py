@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+"""
+Monitoring profiles decide which agent methods AutogenMonitor wraps and how many of
+their calls become events. A profile is a list of method names plus optional
+per-method MethodPolicy objects (sampling rate and rate limit). Methods that are not
+part of a profile are never wrapped, so the "off" profile costs nothing at runtime.
+"""
+
+LIFECYCLE_METHODS = [
+    "initiate_chat",
+    "send",
+    "receive",
+    "generate_reply",
+    "run_code",
+    "execute_code_blocks",
+    "execute_function",
+    "get_human_input",
+]
+
+FULL_METHODS = LIFECYCLE_METHODS + [
+    "_append_oai_message",
+    "_process_received_message",
+    "register_reply",
+    "generate_init_message",
+    "register_function",
+]
+
+DEBUG_METHODS = FULL_METHODS + [
+    "_print_received_message",
+    "_match_trigger",
+    "_format_json_str",
+]
+
+DEFAULT_PROFILE_NAME = os.environ.get("POLYGPT_MONITORING_PROFILE", "debug").lower()
+
+
+class MethodPolicy:
+    """
+    Sampling and rate limiting for one monitored method.
+
+    sample_rate keeps that fraction of calls, spread evenly rather than randomly.
+    rate_limit caps accepted calls per second with a token bucket of size burst.
+    """
+
+    def __init__(self, sample_rate: float = 1.0, rate_limit: Optional[float] = None,
+                 burst: Optional[int] = None):
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError(f"sample_rate must be between 0 and 1, got {sample_rate}")
+        self.sample_rate = sample_rate
+        self.rate_limit = rate_limit
+        self.burst = burst if burst is not None else max(1, int(rate_limit or 1))
+
+        self._credit = 0.0
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def clone(self) -> "MethodPolicy":
+        """A fresh policy with the same settings, so each agent keeps its own budget."""
+        return MethodPolicy(self.sample_rate, self.rate_limit, self.burst)
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.sample_rate < 1.0:
+                self._credit += self.sample_rate
+                if self._credit < 1.0:
+                    return False
+                self._credit -= 1.0
+
+            if self.rate_limit is not None:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._last_refill) * self.rate_limit)
+                self._last_refill = now
+                if self._tokens < 1.0:
+                    return False
+                self._tokens -= 1.0
+            return True
+
+
+class MonitoringProfile:
+    def __init__(self, name: str, methods: Iterable[str],
+                 policies: Optional[Dict[str, MethodPolicy]] = None):
+        self.name = name
+        self.methods = list(methods)
+        self.policies = policies or {}
+
+    def policy_for(self, method_name: str) -> Optional[MethodPolicy]:
+        """Return the policy for a method, or None when every call is kept."""
+        return self.policies.get(method_name)
+
+    def __repr__(self) -> str:
+        return f"MonitoringProfile({self.name!r}, {len(self.methods)} methods)"
+
+
+MONITORING_PROFILES: Dict[str, MonitoringProfile] = {
+    "off": MonitoringProfile("off", []),
+    "lifecycle": MonitoringProfile("lifecycle", LIFECYCLE_METHODS),
+    "full": MonitoringProfile("full", FULL_METHODS),
+    "debug": MonitoringProfile("debug", DEBUG_METHODS),
+}
+
+
+def get_monitoring_profile(profile=None) -> MonitoringProfile:
+    """Resolve a profile name (or an existing MonitoringProfile) to a MonitoringProfile."""
+    if profile is None:
+        profile = DEFAULT_PROFILE_NAME
+    if isinstance(profile, MonitoringProfile):
+        return profile
+    try:
+        return MONITORING_PROFILES[profile.lower()]
+    except KeyError:
+        raise ValueError(
+            f"Unknown monitoring profile: {profile}. "
+            f"Available profiles: {', '.join(MONITORING_PROFILES)}")
@@ -1,85 +1,274 @@
 import asyncio
 import logging
 import inspect
+import threading
+import time
+import weakref
+
+from utils.metrics import LatencyHistogram
 
 logging.basicConfig(level=logging.INFO)
 
+WILDCARD = '*'
+
+_SYNC = 0
+_COROUTINE = 1
+_ASYNC_GEN = 2
+
+
+def _observer_key(observer):
+    # Bound methods are recreated on every attribute access, so key them by
+    # the (instance, function) pair rather than by the method object itself.
+    if inspect.ismethod(observer):
+        return (id(observer.__self__), id(observer.__func__))
+    return id(observer)
+
+
+def _observer_kind(observer):
+    if inspect.iscoroutinefunction(observer):
+        return _COROUTINE
+    if inspect.isasyncgenfunction(observer):
+        return _ASYNC_GEN
+    return _SYNC
+
+
+def _observer_name(observer):
+    return getattr(observer, '__qualname__', None) or repr(observer)
+
+
+class _ObserverEntry:
+    __slots__ = ('key', 'kind', 'ref', 'timeout')
+
+    def __init__(self, key, kind, ref, timeout=None):
+        self.key = key
+        self.kind = kind
+        # Called with no arguments; returns the observer or None once collected
+        self.ref = ref
+        self.timeout = timeout
+
+
+class ObserverStats:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.latency = LatencyHistogram()
+
+    def snapshot(self):
+        return {
+            'calls': self.calls,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'latency': self.latency.snapshot(),
+        }
+
 
 class Observable:
+    """
+    Event registry with precomputed dispatch.
+
+    Observers subscribe to an exact event name, to a prefix pattern such as
+    'generate_*', or to every event with '*'. Weakly held observers are dropped
+    automatically when they are garbage collected. The observers matching an
+    event are resolved once into (sync, async) tuples that are reused until the
+    registry changes.
 
-    def __init__(self):
+    Async observers can be bounded by a timeout (globally or per observer) and a
+    concurrency limit, and can be delivered fire-and-forget, in which case the
+    pending deliveries are tracked and can be awaited with drain_pending().
+    """
+
+    def __init__(self, observer_timeout=None, max_concurrency=None, fire_and_forget=False):
         self._observers = {}
-        self._async_observers = {}
+        self._pattern_observers = {}
+        self._dispatch_cache = {}
         self._done_observers = set()
 
-    def add_observer(self, observer, event='default'):
-        # logging.info(f"Attempting to add observer {observer} for event '{event}'")
-        if event not in self._observers:
-            self._observers[event] = []
-            self._async_observers[event] = []
+        self.observer_timeout = observer_timeout
+        self.max_concurrency = max_concurrency
+        self.fire_and_forget = fire_and_forget
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._pending_tasks = set()
+        self._observer_stats = {}
+        self._stats_lock = threading.Lock()
+
+    def configure_async_delivery(self, observer_timeout=None, max_concurrency=None, fire_and_forget=False):
+        self.observer_timeout = observer_timeout
+        self.max_concurrency = max_concurrency
+        self.fire_and_forget = fire_and_forget
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def add_observer(self, observer, event='default', weak=False, timeout=None):
+        key = _observer_key(observer)
+        if event.endswith(WILDCARD):
+            registry = self._pattern_observers.setdefault(event[:-1], {})
+        else:
+            registry = self._observers.setdefault(event, {})
+        if key in registry:
+            return
 
-        if inspect.iscoroutinefunction(observer) or inspect.isasyncgenfunction(observer):
-            if observer not in self._async_observers[event]:
-                self._async_observers[event].append(observer)
-                # logging.info(f"Async observer {observer} added for event '{event}'")
+        if weak:
+            if inspect.ismethod(observer):
+                ref = weakref.WeakMethod(observer, lambda _: self._discard_key(key))
+            else:
+                ref = weakref.ref(observer, lambda _: self._discard_key(key))
         else:
-            if observer not in self._observers[event]:
-                self._observers[event].append(observer)
-                # logging.info(f"Observer {observer} added for event '{event}'")
+            def ref(observer=observer):
+                return observer
 
-        logging.info(f"Finished adding observer {observer} for event '{event}'")
+        registry[key] = _ObserverEntry(key, _observer_kind(observer), ref, timeout)
+        self._dispatch_cache.clear()
+        logging.debug(f"Added observer {observer} for event '{event}'")
 
     def remove_observer(self, observer, event='default'):
-        # logging.info(f"Attempting to remove observer {observer} from event '{event}'")
-        try:
-            if observer in self._observers[event]:
-                self._observers[event].remove(observer)
-                # logging.info(f"Observer {observer} removed from event '{event}'")
-            elif observer in self._async_observers[event]:
-                self._async_observers[event].remove(observer)
-                # logging.info(f"Async observer {observer} removed from event '{event}'")
-
-            if observer in self._done_observers:
-                self._done_observers.remove(observer)
-        except (ValueError, KeyError) as e:
-            logging.warning(f"Error removing observer {observer} for event '{event}': {e}")
-        # logging.info(f"Finished removing observer {observer} from event '{event}'")
+        key = _observer_key(observer)
+        if event.endswith(WILDCARD):
+            registry = self._pattern_observers.get(event[:-1], {})
+        else:
+            registry = self._observers.get(event, {})
+
+        if registry.pop(key, None) is None:
+            logging.warning(f"Error removing observer {observer} for event '{event}': not registered")
+            return
+        self._done_observers.discard(key)
+        self._dispatch_cache.clear()
+
+    def has_observers(self, event='default'):
+        sync_entries, async_entries = self._dispatch_for(event)
+        return bool(sync_entries or async_entries)
+
+    def _discard_key(self, key):
+        for registry in (*self._observers.values(), *self._pattern_observers.values()):
+            registry.pop(key, None)
+        self._done_observers.discard(key)
+        self._dispatch_cache.clear()
+
+    def _dispatch_for(self, event):
+        dispatch = self._dispatch_cache.get(event)
+        if dispatch is None:
+            entries = dict(self._observers.get(event, {}))
+            for prefix, registry in self._pattern_observers.items():
+                if event.startswith(prefix):
+                    for key, entry in registry.items():
+                        entries.setdefault(key, entry)
+            dispatch = (
+                tuple(e for e in entries.values() if e.kind == _SYNC),
+                tuple(e for e in entries.values() if e.kind != _SYNC),
+            )
+            self._dispatch_cache[event] = dispatch
+        return dispatch
 
     async def notify_observers_async(self, event='default', data=None):
-        # logging.info(f"Starting to notify observers for event '{event}' with data '{data}'")
+        sync_entries, async_entries = self._dispatch_for(event)
+
         # Notify synchronous observers directly
-        for observer in self._observers.get(event, []):
-            if observer in self._done_observers:
+        for entry in sync_entries:
+            if entry.key in self._done_observers:
+                continue
+            observer = entry.ref()
+            if observer is None:
                 continue
+            started = time.perf_counter()
+            failed = False
             try:
                 observer(event, data)
             except Exception as e:
+                failed = True
                 logging.error(f"Error notifying observer {observer} for event '{event}': {e}")
+            self._record_delivery(entry, observer, time.perf_counter() - started, error=failed)
 
         # Notify asynchronous observers concurrently
-        await self._notify_async_observers(event, data)
-        # logging.info(f"Finished notifying observers for event '{event}'")
+        if async_entries:
+            await self._notify_async_observers(event, data, async_entries)
 
-    async def _notify_async_observers(self, event, data):
-        tasks = [self._run_async_observer(observer, event, data)
-                 for observer in self._async_observers.get(event, [])]
+    async def _notify_async_observers(self, event, data, entries):
+        if self.fire_and_forget:
+            for entry in entries:
+                task = asyncio.create_task(self._run_async_observer(entry, event, data))
+                self._pending_tasks.add(task)
+                task.add_done_callback(self._pending_tasks.discard)
+            return
+        tasks = [self._run_async_observer(entry, event, data) for entry in entries]
         await asyncio.gather(*tasks)
 
-    async def _run_async_observer(self, observer, event, data):
-        # logging.info(f"Starting to run async observer {observer} for event '{event}' with data '{data}'")
-        if observer in self._done_observers:
+    async def drain_pending(self, timeout=None):
+        """Wait for fire-and-forget deliveries started on the running loop."""
+        loop = asyncio.get_running_loop()
+        tasks = [task for task in self._pending_tasks if task.get_loop() is loop]
+        if not tasks:
+            return True
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        return not pending
+
+    def observer_metrics(self):
+        """Delivery counts, timeouts, errors and latency percentiles per observer."""
+        with self._stats_lock:
+            observers = {stats.name: stats.snapshot() for stats in self._observer_stats.values()}
+        return {'observers': observers, 'pending_deliveries': len(self._pending_tasks)}
+
+    def _semaphore(self):
+        if self.max_concurrency is None:
+            return None
+        # asyncio primitives are bound to one loop; keep a semaphore per loop.
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    def _record_delivery(self, entry, observer, elapsed, timed_out=False, error=False):
+        with self._stats_lock:
+            stats = self._observer_stats.get(entry.key)
+            if stats is None:
+                stats = self._observer_stats[entry.key] = ObserverStats(_observer_name(observer))
+            stats.calls += 1
+            stats.latency.record(elapsed)
+            if timed_out:
+                stats.timeouts += 1
+            if error:
+                stats.errors += 1
+
+    async def _run_async_observer(self, entry, event, data):
+        if entry.key in self._done_observers:
             return
+        observer = entry.ref()
+        if observer is None:
+            return
+
+        timeout = entry.timeout if entry.timeout is not None else self.observer_timeout
+        semaphore = self._semaphore()
+        started = time.perf_counter()
+        timed_out = failed = False
         try:
-            if inspect.iscoroutinefunction(observer):
-                await observer(event, data)
-            elif inspect.isasyncgenfunction(observer):
-                async_gen = observer(event, data)
-                try:
-                    next_item = await async_gen.asend(None)
-                    if next_item is not None:
-                        logging.info(f"Received {next_item} from observer {observer} for event '{event}'")
-                except StopAsyncIteration:
-                    self._done_observers.add(observer)
+            if semaphore is None:
+                await self._deliver_async(entry, observer, event, data, timeout)
+            else:
+                async with semaphore:
+                    await self._deliver_async(entry, observer, event, data, timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            logging.warning(f"Async observer {observer} timed out after {timeout}s for event '{event}'")
         except Exception as e:
+            failed = True
             logging.error(f"Error notifying async observer {observer} for event '{event}': {e}")
-        # logging.info(f"Finished running async observer {observer} for event '{event}'")
+        self._record_delivery(entry, observer, time.perf_counter() - started, timed_out, failed)
+
+    async def _deliver_async(self, entry, observer, event, data, timeout):
+        if entry.kind == _COROUTINE:
+            delivery = observer(event, data)
+        else:
+            delivery = self._step_async_gen(entry, observer, event, data)
+        if timeout is None:
+            await delivery
+        else:
+            await asyncio.wait_for(delivery, timeout)
+
+    async def _step_async_gen(self, entry, observer, event, data):
+        async_gen = observer(event, data)
+        try:
+            next_item = await async_gen.asend(None)
+            if next_item is not None:
+                logging.info(f"Received {next_item} from observer {observer} for event '{event}'")
+        except StopAsyncIteration:
+            self._done_observers.add(entry.key)
@@ -0,0 +1,234 @@
+import asyncio
+import json
+import queue
+import time
+from typing import Any, List, NamedTuple, Optional
+
+from utils.background_worker import STOP, BackgroundWorker, FlushMarker
+from utils.event_log import TaskEventLog
+from utils.event_payload import payload_json_default
+from utils.poly_logger import PolyLogger
+
+LOG = PolyLogger(__name__)
+
+"""
+Write-behind persistence for agent reactions.
+Reactions append records to an in-memory buffer; a background worker flushes them
+to the Workspace and the AgentDB in batches, when `batch_size` records are buffered
+or `flush_interval` seconds have passed. Within a batch, repeated writes to the same
+workspace file are coalesced so only the last one is serialized and written, the
+events of each task are appended to its TaskEventLog in a single write, and runs of
+create_step calls for a task become one create_steps_bulk insert when the database
+offers it.
+"""
+
+
+class WorkspaceWrite(NamedTuple):
+    task_id: str
+    path: str
+    data: Any
+
+
+class EventAppend(NamedTuple):
+    task_id: str
+    event: dict
+
+
+class DatabaseCall(NamedTuple):
+    method: str
+    args: tuple
+    kwargs: dict
+
+
+class WriteBehindQueue(BackgroundWorker):
+    def __init__(
+        self,
+        database,
+        workspace,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        max_buffer: int = 10000,
+        name: str = "polygpt-write-behind",
+        event_log: TaskEventLog = None,
+    ):
+        super().__init__(name)
+        self.database = database
+        self.workspace = workspace
+        self.event_log = event_log or TaskEventLog(workspace)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._buffer = queue.Queue(maxsize=max_buffer)
+
+        self.queued = 0
+        self.flushed = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def write(self, task_id: str, path: str, data: Any) -> bool:
+        """Queue a workspace write. Non-bytes data is JSON-serialized at flush time."""
+        return self._put(WorkspaceWrite(task_id, path, data))
+
+    def append_event(self, task_id: str, event: dict) -> bool:
+        """Queue an event for the task's append-only event log."""
+        return self._put(EventAppend(task_id, event))
+
+    def call(self, method: str, *args, **kwargs) -> bool:
+        """Queue a call to an AgentDB method; coroutine methods are awaited by the worker."""
+        return self._put(DatabaseCall(method, args, kwargs))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued so far has been persisted."""
+        flushed = super().flush(timeout)
+        if not flushed and not self._in_worker_thread():
+            LOG.warning(f"Write-behind flush timed out: {self.stats()}")
+        return flushed
+
+    def close(self, timeout: Optional[float] = None):
+        """Persist what is buffered and end the worker. Records put afterwards are dropped."""
+        self.stop(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "buffered": self._buffer.qsize(),
+            "queued": self.queued,
+            "flushed": self.flushed,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    def _put(self, record) -> bool:
+        if self._offer(record):
+            return True
+        with self._lock:
+            self.dropped += 1
+        return False
+
+    def _enqueue(self, record):
+        self._buffer.put_nowait(record)
+        self.queued += 1
+
+    def _enqueue_control(self, item):
+        self._buffer.put(item)
+
+    async def _work(self):
+        batch: List = []
+        markers: List[FlushMarker] = []
+        deadline = time.monotonic() + self.flush_interval
+        stopping = False
+
+        while not stopping:
+            try:
+                record = self._buffer.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                record = None
+
+            if record is STOP:
+                stopping = True
+            elif isinstance(record, FlushMarker):
+                markers.append(record)
+            elif record is not None:
+                batch.append(record)
+
+            if stopping or markers or len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                if batch:
+                    await self._flush_batch(batch)
+                    batch = []
+                for marker in markers:
+                    marker.done.set()
+                markers = []
+                deadline = time.monotonic() + self.flush_interval
+
+    async def _flush_batch(self, batch: List):
+        # Keep only the last write per file, but preserve the order of DB calls.
+        last_write = {}
+        for index, record in enumerate(batch):
+            if isinstance(record, WorkspaceWrite):
+                last_write[(record.task_id, record.path)] = index
+
+        events = {}
+        steps: List[DatabaseCall] = []
+        for index, record in enumerate(batch):
+            if isinstance(record, EventAppend):
+                events.setdefault(record.task_id, []).append(record.event)
+                continue
+            if isinstance(record, WorkspaceWrite):
+                if last_write[(record.task_id, record.path)] != index:
+                    self.coalesced += 1
+                    continue
+                ok = self._write_workspace(record)
+            elif self._is_bulk_step(record) and (not steps or steps[0].args[0] == record.args[0]):
+                steps.append(record)
+                continue
+            else:
+                await self._create_steps(steps)
+                steps = [record] if self._is_bulk_step(record) else []
+                if steps:
+                    continue
+                ok = await self._call_database(record)
+            if ok:
+                self.flushed += 1
+            else:
+                self.failed += 1
+        await self._create_steps(steps)
+
+        for task_id, task_events in events.items():
+            try:
+                written = self.event_log.append(task_id, task_events)
+            except Exception as e:
+                LOG.error(f"Error appending events to the log of task {task_id}: {e}")
+                written = 0
+            self.flushed += written
+            self.failed += len(task_events) - written
+
+    def _write_workspace(self, record: WorkspaceWrite) -> bool:
+        data = record.data
+        if not isinstance(data, (bytes, bytearray)):
+            try:
+                data = json.dumps(data, default=payload_json_default).encode('utf-8')
+            except (TypeError, ValueError, RuntimeError) as e:
+                LOG.error(f"Failed to serialize data to JSON: {e}")
+                return False
+        try:
+            self.workspace.write(record.task_id, record.path, data)
+            return True
+        except Exception as e:
+            LOG.error(f"Error saving data to workspace: {e}")
+            return False
+
+    def _is_bulk_step(self, record) -> bool:
+        """A plain create_step(task_id, input) call that create_steps_bulk can take over."""
+        return (
+            isinstance(record, DatabaseCall)
+            and record.method == "create_step"
+            and len(record.args) == 2
+            and not record.kwargs
+            and hasattr(self.database, "create_steps_bulk")
+        )
+
+    async def _create_steps(self, steps: List[DatabaseCall]):
+        if not steps:
+            return
+        if len(steps) == 1:
+            ok = await self._call_database(steps[0])
+            self.flushed += ok
+            self.failed += not ok
+            return
+        ok = await self._call_database(DatabaseCall(
+            "create_steps_bulk", (steps[0].args[0], [step.args[1] for step in steps]), {}))
+        if ok:
+            self.flushed += len(steps)
+        else:
+            self.failed += len(steps)
+
+    async def _call_database(self, record: DatabaseCall) -> bool:
+        try:
+            result = getattr(self.database, record.method)(*record.args, **record.kwargs)
+            if asyncio.iscoroutine(result):
+                await result
+            return True
+        except Exception as e:
+            LOG.error(f"Error running database call {record.method}: {e}")
+            return False
@@ -1,12 +1,43 @@
+import atexit
 import json
 import logging
 import logging.config
 import logging.handlers
 import os
 import queue
+import socket
+import threading
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 JSON_LOGGING = os.environ.get("JSON_LOGGING", "false").lower() == "true"
 
+# All PolyLoggers share one bounded queue, drained by a single listener thread
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+# What to do when the queue is full: drop_new, drop_oldest or block
+LOG_DROP_POLICY = os.environ.get("LOG_DROP_POLICY", "drop_new").lower()
+LOG_BLOCK_TIMEOUT = float(os.environ.get("LOG_BLOCK_TIMEOUT", "1.0"))
+# Optional extra sinks: a plain text log file and a JSON lines log file
+LOG_FILE = os.environ.get("LOG_FILE")
+LOG_JSON_FILE = os.environ.get("LOG_JSON_FILE")
+# Level of every PolyLogger, and the longest message the lazy log methods will emit
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "DEBUG").upper()
+LOG_MAX_MESSAGE_CHARS = int(os.environ.get("LOG_MAX_MESSAGE_CHARS", "2000"))
+# Optional structured sink on a local socket: a unix socket path or host:port
+LOG_JSON_SOCKET = os.environ.get("LOG_JSON_SOCKET")
+LOG_JSON_MAX_BYTES = int(os.environ.get("LOG_JSON_MAX_BYTES", str(64 * 1024 * 1024)))
+LOG_JSON_BACKUPS = int(os.environ.get("LOG_JSON_BACKUPS", "5"))
+# Record fields written by JSON sinks; attributes passed via `extra` can be listed too
+LOG_JSON_FIELDS = tuple(
+    field.strip() for field in os.environ.get(
+        "LOG_JSON_FIELDS", "time,level,name,message,module,funcName,lineno,threadName"
+    ).split(",") if field.strip()
+)
+
 CHAT = 29
 logging.addLevelName(CHAT, "CHAT")
 
@@ -43,9 +74,162 @@ KEYWORD_COLORS: dict[str, str] = {
 }
 
 
+def _json_default(value):
+    return str(value)
+
+
+def dumps_json(data: dict) -> bytes:
+    """Serialize with orjson when it is installed; anything unserializable becomes str()."""
+    if orjson is not None:
+        return orjson.dumps(data, default=_json_default)
+    return json.dumps(data, default=_json_default, ensure_ascii=False).encode("utf-8")
+
+
+def structured_record(record: logging.LogRecord, fields=LOG_JSON_FIELDS) -> dict:
+    """The whitelisted fields of a record, as a flat dict."""
+    data = {}
+    for field in fields:
+        if field == "time":
+            data["time"] = record.created
+        elif field == "level":
+            data["level"] = record.levelname
+        elif field == "message":
+            message = record.getMessage()
+            if record.exc_info and not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            if record.exc_text and record.exc_text not in message:
+                message = f"{message}\n{record.exc_text}"
+            data["message"] = message
+        elif hasattr(record, field):
+            data[field] = getattr(record, field)
+    return data
+
+
 class JsonFormatter(logging.Formatter):
+    def __init__(self, fields=LOG_JSON_FIELDS):
+        super().__init__()
+        self.fields = fields
+
     def format(self, record):
-        return json.dumps(record.__dict__)
+        return dumps_json(structured_record(record, self.fields)).decode("utf-8")
+
+
+class _RotatingFileTarget:
+    def __init__(self, path: str, max_bytes: int = LOG_JSON_MAX_BYTES, backups: int = LOG_JSON_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._file = open(path, "ab")
+
+    def write(self, data: bytes):
+        if self.max_bytes and self._file.tell() and self._file.tell() + len(data) > self.max_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+
+    def _rotate(self):
+        self._file.close()
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "ab")
+
+    def close(self):
+        self._file.close()
+
+
+class _SocketTarget:
+    """Stream socket to a local collector; reconnects on the next batch after a failure."""
+
+    def __init__(self, address: str):
+        self.address = address
+        self._socket = None
+
+    def _connect(self):
+        if ":" in self.address and not self.address.startswith("/"):
+            host, port = self.address.rsplit(":", 1)
+            return socket.create_connection((host, int(port)), timeout=1.0)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(1.0)
+        sock.connect(self.address)
+        return sock
+
+    def write(self, data: bytes):
+        if self._socket is None:
+            self._socket = self._connect()
+        try:
+            self._socket.sendall(data)
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+class BatchingJsonSink(logging.Handler):
+    """
+    Structured log sink: each record is serialized once to a JSON line, lines are
+    batched and written to the target in one call when `batch_size` lines are
+    buffered or `flush_interval` seconds have passed. Runs on the log listener
+    thread, plus a timer thread for the interval flushes. Batches the target fails
+    to take are dropped and counted.
+    """
+
+    def __init__(self, target, batch_size: int = 256, flush_interval: float = 1.0,
+                 fields=LOG_JSON_FIELDS, level=logging.NOTSET):
+        super().__init__(level)
+        self.target = target
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fields = fields
+        self._batch = []
+        self._stop_flushing = threading.Event()
+        self.written = 0
+        self.dropped = 0
+        self._timer = threading.Thread(target=self._flush_periodically, name="polygpt-log-sink", daemon=True)
+        self._timer.start()
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            line = dumps_json(structured_record(record, self.fields)) + b"\n"
+        except Exception:
+            self.handleError(record)
+            return
+        with self.lock:
+            self._batch.append(line)
+            full = len(self._batch) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            batch, self._batch = self._batch, []
+            if not batch:
+                return
+            try:
+                self.target.write(b"".join(batch))
+                self.written += len(batch)
+            except Exception:
+                self.dropped += len(batch)
+
+    def _flush_periodically(self):
+        while not self._stop_flushing.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self._stop_flushing.set()
+        self.flush()
+        with self.lock:
+            self.target.close()
+        super().close()
 
 
 def formatter_message(message: str, use_color: bool = True) -> str:
@@ -88,7 +272,8 @@ class ConsoleFormatter(logging.Formatter):
         """
         Format and highlight certain keywords
         """
-        rec = record
+        # Work on a copy: the same record is handed to every sink
+        rec = logging.makeLogRecord(record.__dict__)
         levelname = rec.levelname
         if self.use_color and levelname in KEYWORD_COLORS:
             levelname_color = KEYWORD_COLORS[levelname] + levelname + RESET_SEQ
@@ -100,6 +285,137 @@ class ConsoleFormatter(logging.Formatter):
         return logging.Formatter.format(self, rec)
 
 
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler over a bounded queue. When the queue is full a record is dropped
+    (the new one, or the oldest queued one) or, with "block", the caller waits up to
+    block_timeout seconds before dropping it. Dropped records are counted.
+    """
+
+    POLICIES = ("drop_new", "drop_oldest", "block")
+
+    def __init__(self, log_queue: queue.Queue, policy: str = "drop_new", block_timeout: float = 1.0):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown log drop policy: {policy}. Available policies: {', '.join(self.POLICIES)}")
+        super().__init__(log_queue)
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            if self.policy == "block":
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if self.policy == "drop_oldest":
+            try:
+                self.queue.get_nowait()
+                self.queue.put_nowait(record)
+            except (queue.Empty, queue.Full):
+                pass
+        self._count_drop()
+
+    def _count_drop(self):
+        with self._dropped_lock:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """
+    The shared log queue, its QueueHandler (attached to every PolyLogger) and the
+    QueueListener thread that formats records and writes them to the sinks: the
+    console, plus a text file (LOG_FILE), and batched JSON lines written to a rotating
+    file (LOG_JSON_FILE) or a local socket (LOG_JSON_SOCKET).
+    """
+
+    def __init__(
+        self,
+        max_size: int = LOG_QUEUE_SIZE,
+        policy: str = LOG_DROP_POLICY,
+        block_timeout: float = LOG_BLOCK_TIMEOUT,
+        log_file: str = LOG_FILE,
+        json_log_file: str = LOG_JSON_FILE,
+        json_log_socket: str = LOG_JSON_SOCKET,
+    ):
+        self.queue = queue.Queue(max_size)
+        self.handler = BoundedQueueHandler(self.queue, policy, block_timeout)
+        self.sinks = self._build_sinks(log_file, json_log_file, json_log_socket)
+        self.listener = logging.handlers.QueueListener(
+            self.queue, *self.sinks, respect_handler_level=True)
+        self._started = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _build_sinks(log_file, json_log_file, json_log_socket):
+        console = logging.StreamHandler()
+        console.setFormatter(JsonFormatter() if JSON_LOGGING else ConsoleFormatter(PolyLogger.COLOR_FORMAT))
+        sinks = [console]
+        if log_file:
+            file_sink = logging.FileHandler(log_file, encoding="utf-8")
+            file_sink.setFormatter(logging.Formatter(PolyLogger.FORMAT))
+            sinks.append(file_sink)
+        if json_log_file:
+            sinks.append(BatchingJsonSink(_RotatingFileTarget(json_log_file)))
+        if json_log_socket:
+            sinks.append(BatchingJsonSink(_SocketTarget(json_log_socket)))
+        return sinks
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self.listener.start()
+            self._started = True
+            atexit.register(self.stop)
+
+    def stop(self):
+        """Write out everything still queued and stop the listener thread."""
+        with self._lock:
+            if not self._started:
+                return
+            self.listener.stop()
+            self._started = False
+            for sink in self.sinks:
+                sink.close()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until the listener has taken every queued record."""
+        deadline = time.monotonic() + timeout
+        while self.queue.qsize() and time.monotonic() < deadline:
+            time.sleep(0.005)
+        for sink in self.sinks:
+            sink.flush()
+        return not self.queue.qsize()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize(),
+            "max_size": self.queue.maxsize,
+            "dropped": self.handler.dropped,
+            "policy": self.handler.policy,
+            "sink_dropped": sum(getattr(sink, "dropped", 0) for sink in self.sinks),
+        }
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_log_pipeline() -> LogPipeline:
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = LogPipeline()
+                _pipeline.start()
+    return _pipeline
+
+
 class PolyLogger(logging.Logger):
     """
     This adds extra logging functions such as logger.trade and also
@@ -113,47 +429,72 @@ class PolyLogger(logging.Logger):
     COLOR_FORMAT: str = formatter_message(CONSOLE_FORMAT, True)
     JSON_FORMAT: str = '{"time": "%(asctime)s", "name": "%(name)s", "level": "%(levelname)s", "message": "%(message)s"}'
 
-    def __init__(self, name: str, logLevel: str = "DEBUG"):
+    def __init__(self, name: str, logLevel: str = LOG_LEVEL):
         logging.Logger.__init__(self, name, logLevel)
 
-        # Queue Handler
-        queue_handler = logging.handlers.QueueHandler(queue.Queue(-1))
-        json_formatter = logging.Formatter(self.JSON_FORMAT)
-        queue_handler.setFormatter(json_formatter)
-        self.addHandler(queue_handler)
+        # Records are formatted and written by the shared pipeline's listener thread
+        self.addHandler(get_log_pipeline().handler)
 
-        if JSON_LOGGING:
-            console_formatter = JsonFormatter()
-        else:
-            console_formatter = ConsoleFormatter(self.COLOR_FORMAT)
-        console = logging.StreamHandler()
-        console.setFormatter(console_formatter)
-        self.addHandler(console)
+    def setLevel(self, level):
+        super().setLevel(level)
+        # PolyLoggers are not registered with the logging manager, which only resets
+        # the isEnabledFor() cache of the loggers it knows about
+        self._cache.clear()
 
-    def chat(self, role: str, openai_repsonse: dict, messages=None, *args, **kws):
+    def lazy(self, level: int, build, *args, max_chars: int = LOG_MAX_MESSAGE_CHARS, stacklevel: int = 1):
         """
-        Parse the content, log the message and extract the usage into prometheus metrics
+        Log build(*args) only if the level is enabled, so nothing is formatted for
+        records that would be discarded. The message is cut to max_chars characters.
         """
+        if not self.isEnabledFor(level):
+            return
+        message = build(*args)
+        if max_chars and len(message) > max_chars:
+            message = f"{message[:max_chars]}... [{len(message) - max_chars} chars truncated]"
+        # Report the caller of debug_lazy()/info_lazy()/..., not this method
+        self._log(level, message, (), stacklevel=stacklevel + 1)
+
+    def debug_lazy(self, build, *args, **kws):
+        self.lazy(logging.DEBUG, build, *args, stacklevel=2, **kws)
+
+    def info_lazy(self, build, *args, **kws):
+        self.lazy(logging.INFO, build, *args, stacklevel=2, **kws)
+
+    def warning_lazy(self, build, *args, **kws):
+        self.lazy(logging.WARNING, build, *args, stacklevel=2, **kws)
+
+    def chat(self, role: str, openai_repsonse: dict, messages=None, *args,
+             agent: str = None, task_id: str = None, latency: float = None, **kws):
+        """
+        Parse the content, log the message and extract the usage into prometheus metrics.
+        The response may be a JSON string or an already parsed dict; it is parsed once and
+        its token usage is recorded for the agent (by default the one currently running)
+        and task even when CHAT records are filtered out.
+        """
+        # Imported here as utils.usage_metrics itself logs through PolyLogger
+        from utils.usage_metrics import USAGE_METRICS, parse_chat_response
+
         role_emojis = {
             "system": "🖥️",
             "user": "👤",
             "assistant": "🤖",
             "function": "⚙️",
         }
-        if self.isEnabledFor(CHAT):
-            if messages:
+        if messages:
+            if self.isEnabledFor(CHAT):
                 for message in messages:
                     self._log(
                         CHAT,
                         f"{role_emojis.get(message['role'], '🔵')}: {message['content']}",
+                        (),
                     )
-            else:
-                response = json.loads(openai_repsonse)
+            return
 
-                self._log(
-                    CHAT,
-                    f"{role_emojis.get(role, '🔵')}: {response['choices'][0]['message']['content']}",
-                )
+        response = parse_chat_response(openai_repsonse)
+        USAGE_METRICS.record_response(response, latency=latency, agent=agent, task_id=task_id)
+        if self.isEnabledFor(CHAT):
+            content = response["choices"][0]["message"].get("content") or ""
+            self._log(CHAT, f"{role_emojis.get(role, '🔵')}: {content}", ())
 
 
 class QueueLogger(logging.Logger):
@@ -163,8 +504,7 @@ class QueueLogger(logging.Logger):
 
     def __init__(self, name: str, level: int = logging.NOTSET):
         super().__init__(name, level)
-        queue_handler = logging.handlers.QueueHandler(queue.Queue(-1))
-        self.addHandler(queue_handler)
+        self.addHandler(get_log_pipeline().handler)
 
 
 logging_config: dict = dict(
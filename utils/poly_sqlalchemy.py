@@ -1,17 +1,26 @@
 from sqlalchemy.exc import SQLAlchemyError
 
 import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from sqlalchemy import (
     Column,
     DateTime,
+    Float,
+    Index,
+    Integer,
     String,
+    and_,
+    insert,
+    or_,
 )
 import uuid
+from sqlalchemy.orm import Session
 
 from utils.poly_logger import PolyLogger
 from utils.mongo_db import (
     AgentDB,
-    Base
+    Base,
+    sequential_timestamps,
 )
 
 from utils.errors import NotFoundError
@@ -30,6 +39,8 @@ class ChatModel(Base):
         DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow
     )
 
+    __table_args__ = (Index("ix_chat_task_id_created_at", "task_id", "created_at", "msg_id"),)
+
 
 class ActionModel(Base):
     __tablename__ = "action"
@@ -42,30 +53,90 @@ class ActionModel(Base):
         DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow
     )
 
+    __table_args__ = (Index("ix_action_task_id_created_at", "task_id", "created_at", "action_id"),)
+
+
+class TaskUsageModel(Base):
+    """LLM usage of a task, one row per agent and model, incremented as usage is flushed."""
+    __tablename__ = "task_usage"
+    task_id = Column(String, primary_key=True)
+    agent = Column(String, primary_key=True)
+    model = Column(String, primary_key=True)
+    calls = Column(Integer, default=0)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    cost = Column(Float, default=0.0)
+    latency_seconds = Column(Float, default=0.0)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    modified_at = Column(
+        DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow
+    )
+
 
 class PolyDatabase(AgentDB):
 
     async def add_chat_history(self, task_id, messages):
-        for message in messages:
-            await self.add_chat_message(task_id, message['role'], message['content'])
+        return await self.add_chat_messages_bulk(task_id, messages)
+
+    async def add_chat_messages_bulk(self, task_id, messages):
+        """
+        Insert a list of {"role", "content"} messages in one statement and one commit.
+        Returns the new msg_ids in message order.
+        """
+        messages = list(messages)
+        if not messages:
+            return []
+        if self.debug_enabled:
+            LOG.debug(f"Creating {len(messages)} chat messages for task_id: {task_id}")
+
+        msg_ids = [str(uuid.uuid4()) for _ in messages]
+        rows = [
+            {
+                "msg_id": msg_id,
+                "task_id": task_id,
+                "role": message['role'],
+                "content": message['content'],
+                "created_at": created_at,
+                "modified_at": created_at,
+            }
+            for msg_id, message, created_at in zip(
+                msg_ids, messages, sequential_timestamps(len(messages)))
+        ]
+
+        def create(session: Session):
+            session.execute(insert(ChatModel), rows)
+            session.commit()
+            return msg_ids
+
+        try:
+            return await self._run(create)
+        except SQLAlchemyError as e:
+            LOG.error(f"SQLAlchemy error while creating chat messages: {e}")
+            raise
+        except Exception as e:
+            LOG.error(f"Unexpected error while creating chat messages: {e}")
+            raise
 
     async def add_chat_message(self, task_id, role, content):
         if self.debug_enabled:
             LOG.debug("Creating new task")
+
+        def create(session: Session) -> ChatModel:
+            mew_msg = ChatModel(
+                msg_id=str(uuid.uuid4()),
+                task_id=task_id,
+                role=role,
+                content=content,
+            )
+            session.add(mew_msg)
+            session.commit()
+            session.refresh(mew_msg)
+            if self.debug_enabled:
+                LOG.debug(f"Created new Chat message with task_id: {mew_msg.msg_id}")
+            return mew_msg
+
         try:
-            with self.Session() as session:
-                mew_msg = ChatModel(
-                    msg_id=str(uuid.uuid4()),
-                    task_id=task_id,
-                    role=role,
-                    content=content,
-                )
-                session.add(mew_msg)
-                session.commit()
-                session.refresh(mew_msg)
-                if self.debug_enabled:
-                    LOG.debug(f"Created new Chat message with task_id: {mew_msg.msg_id}")
-                return mew_msg
+            return await self._run(create)
         except SQLAlchemyError as e:
             LOG.error(f"SQLAlchemy error while creating task: {e}")
             raise
@@ -79,19 +150,22 @@ class PolyDatabase(AgentDB):
     async def get_chat_history(self, task_id):
         if self.debug_enabled:
             LOG.debug(f"Getting chat history with task_id: {task_id}")
+
+        def get(session: Session):
+            if messages := (
+                session.query(ChatModel)
+                .filter(ChatModel.task_id == task_id)
+                .order_by(ChatModel.created_at)
+                .all()
+            ):
+                return [{"role": m.role, "content": m.content} for m in messages]
+
+            else:
+                LOG.error(f"Chat history not found with task_id: {task_id}")
+                raise NotFoundError("Chat history not found")
+
         try:
-            with self.Session() as session:
-                if messages := (
-                    session.query(ChatModel)
-                    .filter(ChatModel.task_id == task_id)
-                    .order_by(ChatModel.created_at)
-                    .all()
-                ):
-                    return [{"role": m.role, "content": m.content} for m in messages]
-
-                else:
-                    LOG.error(f"Chat history not found with task_id: {task_id}")
-                    raise NotFoundError("Chat history not found")
+            return await self._run(get)
         except SQLAlchemyError as e:
             LOG.error(f"SQLAlchemy error while getting chat history: {e}")
             raise
@@ -102,21 +176,129 @@ class PolyDatabase(AgentDB):
             LOG.error(f"Unexpected error while getting chat history: {e}")
             raise
 
+    async def iter_chat_history(
+        self, task_id, batch_size: int = 500, since_msg_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, str]]:
+        """
+        Yield the task's messages in order, fetching `batch_size` rows per query, so a
+        long conversation is never held in memory at once. Starts after since_msg_id
+        when given. Yields nothing for a task without history.
+        """
+        position = await self._run(lambda session: self._chat_position(session, task_id, since_msg_id)) \
+            if since_msg_id else None
+        while True:
+            batch, position = await self._run(
+                lambda session: self._chat_batch(session, task_id, position, batch_size))
+            for message in batch:
+                yield message
+            if len(batch) < batch_size:
+                return
+
+    async def get_last_chat_messages(self, task_id, count: int) -> List[Dict[str, str]]:
+        """The newest `count` messages of the task, oldest first."""
+        def get(session: Session):
+            rows = (
+                session.query(ChatModel.role, ChatModel.content)
+                .filter(ChatModel.task_id == task_id)
+                .order_by(ChatModel.created_at.desc(), ChatModel.msg_id.desc())
+                .limit(count)
+                .all()
+            )
+            return [{"role": row.role, "content": row.content} for row in reversed(rows)]
+
+        try:
+            return await self._run(get)
+        except SQLAlchemyError as e:
+            LOG.error(f"SQLAlchemy error while getting last chat messages: {e}")
+            raise
+        except Exception as e:
+            LOG.error(f"Unexpected error while getting last chat messages: {e}")
+            raise
+
+    async def get_chat_messages_since(
+        self,
+        task_id,
+        since: Optional[datetime.datetime] = None,
+        msg_id: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, str]]:
+        """
+        Messages created after `since`, or after the message `msg_id`, oldest first and
+        at most `limit` of them. Raises NotFoundError if msg_id does not exist.
+        """
+        def get(session: Session):
+            if msg_id is not None:
+                position = self._chat_position(session, task_id, msg_id)
+            else:
+                position = (since, None) if since is not None else None
+            batch, _ = self._chat_batch(session, task_id, position, limit)
+            return batch
+
+        try:
+            return await self._run(get)
+        except SQLAlchemyError as e:
+            LOG.error(f"SQLAlchemy error while getting chat messages: {e}")
+            raise
+        except NotFoundError as e:
+            LOG.error(f"NotFoundError while getting chat messages: {e}")
+            raise
+        except Exception as e:
+            LOG.error(f"Unexpected error while getting chat messages: {e}")
+            raise
+
+    def _chat_position(self, session: Session, task_id, msg_id: str) -> Tuple[datetime.datetime, str]:
+        created_at = (
+            session.query(ChatModel.created_at)
+            .filter(ChatModel.task_id == task_id, ChatModel.msg_id == msg_id)
+            .scalar()
+        )
+        if created_at is None:
+            LOG.error(f"Chat message not found with task_id: {task_id} and msg_id: {msg_id}")
+            raise NotFoundError("Chat message not found")
+        return created_at, msg_id
+
+    def _chat_batch(self, session: Session, task_id, position, limit: Optional[int]):
+        """
+        Messages after position (created_at, msg_id) in (created_at, msg_id) order, served
+        by the (task_id, created_at, msg_id) index. A position without msg_id means
+        "strictly after created_at". Returns the messages and the position of the last one.
+        """
+        query = session.query(ChatModel.msg_id, ChatModel.role, ChatModel.content, ChatModel.created_at) \
+            .filter(ChatModel.task_id == task_id)
+        if position is not None:
+            created_at, after_id = position
+            if after_id is None:
+                query = query.filter(ChatModel.created_at > created_at)
+            else:
+                query = query.filter(or_(
+                    ChatModel.created_at > created_at,
+                    and_(ChatModel.created_at == created_at, ChatModel.msg_id > after_id),
+                ))
+        query = query.order_by(ChatModel.created_at, ChatModel.msg_id)
+        if limit is not None:
+            query = query.limit(limit)
+        rows = query.all()
+        if rows:
+            position = (rows[-1].created_at, rows[-1].msg_id)
+        return [{"role": row.role, "content": row.content} for row in rows], position
+
     async def create_action(self, task_id, name, args):
+        def create(session: Session) -> ActionModel:
+            new_action = ActionModel(
+                action_id=str(uuid.uuid4()),
+                task_id=task_id,
+                name=name,
+                args=str(args),
+            )
+            session.add(new_action)
+            session.commit()
+            session.refresh(new_action)
+            if self.debug_enabled:
+                LOG.debug(f"Created new Action with task_id: {new_action.action_id}")
+            return new_action
+
         try:
-            with self.Session() as session:
-                new_action = ActionModel(
-                    action_id=str(uuid.uuid4()),
-                    task_id=task_id,
-                    name=name,
-                    args=str(args),
-                )
-                session.add(new_action)
-                session.commit()
-                session.refresh(new_action)
-                if self.debug_enabled:
-                    LOG.debug(f"Created new Action with task_id: {new_action.action_id}")
-                return new_action
+            return await self._run(create)
         except SQLAlchemyError as e:
             LOG.error(f"SQLAlchemy error while creating action: {e}")
             raise
@@ -127,22 +309,64 @@ class PolyDatabase(AgentDB):
             LOG.error(f"Unexpected error while creating action: {e}")
             raise
 
+    async def create_actions_bulk(self, task_id, actions):
+        """
+        Insert a list of {"name", "args"} actions in one statement and one commit.
+        Returns the new action_ids in order.
+        """
+        actions = list(actions)
+        if not actions:
+            return []
+        if self.debug_enabled:
+            LOG.debug(f"Creating {len(actions)} actions for task_id: {task_id}")
+
+        action_ids = [str(uuid.uuid4()) for _ in actions]
+        rows = [
+            {
+                "action_id": action_id,
+                "task_id": task_id,
+                "name": action['name'],
+                "args": str(action['args']),
+                "created_at": created_at,
+                "modified_at": created_at,
+            }
+            for action_id, action, created_at in zip(
+                action_ids, actions, sequential_timestamps(len(actions)))
+        ]
+
+        def create(session: Session):
+            session.execute(insert(ActionModel), rows)
+            session.commit()
+            return action_ids
+
+        try:
+            return await self._run(create)
+        except SQLAlchemyError as e:
+            LOG.error(f"SQLAlchemy error while creating actions: {e}")
+            raise
+        except Exception as e:
+            LOG.error(f"Unexpected error while creating actions: {e}")
+            raise
+
     async def get_action_history(self, task_id):
         if self.debug_enabled:
             LOG.debug(f"Getting action history with task_id: {task_id}")
+
+        def get(session: Session):
+            if actions := (
+                session.query(ActionModel)
+                .filter(ActionModel.task_id == task_id)
+                .order_by(ActionModel.created_at)
+                .all()
+            ):
+                return [{"name": a.name, "args": a.args} for a in actions]
+
+            else:
+                LOG.error(  f"Action history not found with task_id: {task_id}"  )
+                raise NotFoundError("Action history not found")
+
         try:
-            with self.Session() as session:
-                if actions := (
-                    session.query(ActionModel)
-                    .filter(ActionModel.task_id == task_id)
-                    .order_by(ActionModel.created_at)
-                    .all()
-                ):
-                    return [{"name": a.name, "args": a.args} for a in actions]
-
-                else:
-                    LOG.error(  f"Action history not found with task_id: {task_id}"  )
-                    raise NotFoundError("Action history not found")
+            return await self._run(get)
         except SQLAlchemyError as e:
             LOG.error(f"SQLAlchemy error while getting action history: {e}")
             raise
@@ -152,3 +376,80 @@ class PolyDatabase(AgentDB):
         except Exception as e:
             LOG.error(f"Unexpected error while getting action history: {e}")
             raise
+
+    async def add_task_usage(self, task_id, rows):
+        """
+        Add per agent and model usage totals ({"agent", "model", "calls", "prompt_tokens",
+        "completion_tokens", "cost", "latency_seconds"}) to the task's stored summary.
+        """
+        rows = list(rows)
+        if not rows:
+            return
+        if self.debug_enabled:
+            LOG.debug(f"Adding LLM usage for task_id: {task_id}")
+
+        counters = ("calls", "prompt_tokens", "completion_tokens", "cost", "latency_seconds")
+
+        def add(session: Session):
+            existing = {
+                (usage.agent, usage.model): usage
+                for usage in session.query(TaskUsageModel).filter(TaskUsageModel.task_id == task_id)
+            }
+            for row in rows:
+                usage = existing.get((row["agent"], row["model"]))
+                if usage is None:
+                    usage = existing[(row["agent"], row["model"])] = TaskUsageModel(
+                        task_id=task_id, agent=row["agent"], model=row["model"],
+                        **{counter: 0 for counter in counters})
+                    session.add(usage)
+                for counter in counters:
+                    setattr(usage, counter, getattr(usage, counter) + row.get(counter, 0))
+            session.commit()
+
+        try:
+            return await self._run(add)
+        except SQLAlchemyError as e:
+            LOG.error(f"SQLAlchemy error while adding task usage: {e}")
+            raise
+        except Exception as e:
+            LOG.error(f"Unexpected error while adding task usage: {e}")
+            raise
+
+    async def get_task_usage(self, task_id) -> Dict[str, object]:
+        """Token, cost and latency totals of a task, overall and per agent and model."""
+        if self.debug_enabled:
+            LOG.debug(f"Getting LLM usage with task_id: {task_id}")
+
+        def get(session: Session):
+            usages = (
+                session.query(TaskUsageModel)
+                .filter(TaskUsageModel.task_id == task_id)
+                .order_by(TaskUsageModel.agent, TaskUsageModel.model)
+                .all()
+            )
+            rows = [
+                {
+                    "agent": u.agent,
+                    "model": u.model,
+                    "calls": u.calls,
+                    "prompt_tokens": u.prompt_tokens,
+                    "completion_tokens": u.completion_tokens,
+                    "cost": u.cost,
+                    "latency_seconds": u.latency_seconds,
+                }
+                for u in usages
+            ]
+            total = {
+                key: sum(row[key] for row in rows)
+                for key in ("calls", "prompt_tokens", "completion_tokens", "cost", "latency_seconds")
+            }
+            return {"task_id": task_id, "total": total, "by_agent": rows}
+
+        try:
+            return await self._run(get)
+        except SQLAlchemyError as e:
+            LOG.error(f"SQLAlchemy error while getting task usage: {e}")
+            raise
+        except Exception as e:
+            LOG.error(f"Unexpected error while getting task usage: {e}")
+            raise
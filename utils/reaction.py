@@ -1,17 +1,34 @@
-import json
-from typing import Any
+import functools
+import time
+from typing import Any, Callable, Dict, Iterable, Tuple
 
+from utils.persistence_queue import WriteBehindQueue
 from utils.poly_logger import PolyLogger
+from utils.schema import StepRequestBody
 
 LOG = PolyLogger(__name__)
 
+
+def requires_task(handler):
+    """Mark a reaction that does nothing unless the event names a task."""
+    handler.requires_task = True
+    return handler
+
+
 class PolyAutogenReact :
     """Handles reactions to method calls."""
 
-    def __init__(self, agent, database, workspace):
+    # Events that have an on_* handler but need no reaction; they are never delivered.
+    ignored_events = frozenset({"_format_json_str", "send"})
+    # Whether events without an on_* handler go to default_reaction (only when a task is attached).
+    handle_unknown_events = True
+
+    def __init__(self, agent, database, workspace, persistence: WriteBehindQueue = None):
         self.agent = agent
         self.database = database
         self.workspace = workspace
+        # Workspace and DB writes are buffered and flushed off the hot path
+        self.persistence = persistence or WriteBehindQueue(database, workspace)
         LOG.info(f"🔔 {self.agent.name}: Reaction class initialized.")
 
     def _log_with_task_step(self, agent_name, message, data):
@@ -25,8 +42,8 @@ class PolyAutogenReact :
         message = data.get('message')
         if task_id and message:
             # Create a new step with the message as input
-            step_input = {"input": message}
-            self.database.create_step(task_id, step_input)
+            step_input = StepRequestBody(input=message)
+            self.persistence.call("create_step", task_id, step_input)
             # LOG.info(f"🔔 {self.agent.name} [Task: {task_id}]: Message received and saved to database.")
         # else:
             # LOG.warning(f"⚠️ {self.agent.name} [Task: {task_id}]: Failed to save received message to database. Task ID or message missing.")
@@ -37,59 +54,81 @@ class PolyAutogenReact :
         code = data.get('code')
         if task_id and code:
             # Create a new artifact with the code as a file_name (or any other relevant attribute)
-            self.database.create_artifact(task_id, file_name=code, relative_path="code_executed")
-            LOG.info(f"🔔 {self.agent.name} [Task: {task_id}]: Executed code saved to database.")
+            self.persistence.call(
+                "create_artifact", task_id, file_name=code, relative_path="code_executed")
+            LOG.info_lazy(lambda: f"🔔 {self.agent.name} [Task: {task_id}]: Executed code queued for the database.")
         else:
             LOG.warning(f"⚠️ {self.agent.name} [Task: {task_id}]: Failed to save executed code to database. Task ID or code missing.")
 
     def save_to_workspace(self, task_id: str, path: str, data: Any):
-        # First, we'll attempt to serialize the data to a JSON string
-        try:
-            data_str = json.dumps(data, default=str)
-            data_bytes = data_str.encode('utf-8')
-        except TypeError as e:
-            LOG.error(f"Failed to serialize data to JSON: {e}")
-            return
-
-        # Attempt to save the serialized data to the workspace
-        try:
-            self.workspace.write(task_id, path, data_bytes)
-            LOG.info(f"Successfully saved data to workspace for task {task_id} at path {path}")
-        except Exception as e:
-            LOG.error(f"Error saving data to workspace: {e}")
+        # Serialization and the file write happen on the write-behind worker
+        if self.persistence.write(task_id, path, data):
+            LOG.info_lazy(lambda: f"Queued data for workspace task {task_id} at path {path}")
+        else:
+            LOG.warning(f"Write-behind buffer full, dropped workspace data for task {task_id} at path {path}")
+
+    def record_event(self, agent, event: str, data: Any = None):
+        """Append the event to its task's append-only event log, if the data names a task."""
+        if data and 'current_task_id' in data:
+            self.persistence.append_event(data['current_task_id'], {
+                "ts": time.time(),
+                "agent": agent.name,
+                "event": event,
+                "step_id": data.get('current_step_id'),
+                "data": data,
+            })
+
+    def compile_handlers(self, events: Iterable[str]) -> Dict[str, Tuple[Callable, bool]]:
+        """
+        Resolve each event to (bound handler, requires_task_id) once, up front.
+        Events this reaction does not care about are left out of the table.
+        """
+        handlers = {}
+        for event in events:
+            if event in self.ignored_events:
+                continue
+            handler = getattr(self, f"on_{event}", None)
+            if handler is not None:
+                handlers[event] = (handler, getattr(handler, "requires_task", False))
+            elif self.handle_unknown_events:
+                handlers[event] = (functools.partial(self.default_reaction, event=event), True)
+        return handlers
 
     def react(self, method_name: str, data: Any = None):
         """React based on the method that was called."""
         self._log_with_task_step(self.agent.name, f"Reacting to method: {method_name}.", data)
         reaction_method = getattr(self, f"on_{method_name}", self.default_reaction)
         self._log_with_task_step(self.agent.name, f"Found reaction method: {reaction_method.__name__}.", data)
-        reaction_method(self.agent, data)
+        if reaction_method == self.default_reaction:
+            reaction_method(self.agent, data, event=method_name)
+        else:
+            reaction_method(self.agent, data)
         self._log_with_task_step(self.agent.name, "Reaction method executed.", data)
 
-    def default_reaction(self, agent, data: Any = None):
+    @requires_task
+    def default_reaction(self, agent, data: Any = None, event: str = 'default_reaction'):
         self._log_with_task_step(agent.name, "No reaction defined for this method.", data)
-        if data and 'current_task_id' in data:
-            self.save_to_workspace(data['current_task_id'], 'default_reaction_data.json', data)
+        self.record_event(agent, event, data)
 
+    @requires_task
     def on__append_oai_message(self, agent, data: Any = None):
         self._log_with_task_step(agent.name, "Detected an _append_oai_message call! Reacting accordingly.", data)
-        if data and 'current_task_id' in data:
-            self.save_to_workspace(data['current_task_id'], '_append_oai_message_data.json', data)
+        self.record_event(agent, '_append_oai_message', data)
 
+    @requires_task
     def on__process_received_message(self, agent, data: Any = None):
         self._log_with_task_step(agent.name, "Detected a _process_received_message call! Reacting accordingly.", data)
-        if data and 'current_task_id' in data:
-            self.save_to_workspace(data['current_task_id'], '_process_received_message_data.json', data)
+        self.record_event(agent, '_process_received_message', data)
 
+    @requires_task
     def on__print_received_message(self, agent, data: Any = None):
         self._log_with_task_step(agent.name, "Detected a _print_received_message call! Reacting accordingly.", data)
-        if data and 'current_task_id' in data:
-            self.save_to_workspace(data['current_task_id'], '_print_received_message_data.json', data)
+        self.record_event(agent, '_print_received_message', data)
 
+    @requires_task
     def on__match_trigger(self, agent, data: Any = None):
         self._log_with_task_step(agent.name, "Detected a _match_trigger call! Reacting accordingly.", data)
-        if data and 'current_task_id' in data:
-            self.save_to_workspace(data['current_task_id'], '_match_trigger_data.json', data)
+        self.record_event(agent, '_match_trigger', data)
 
     def on_run_code(self, agent, data: Any = None):
         self._log_with_task_step(agent.name, "Detected a run_code call! Reacting accordingly.", data)
@@ -103,48 +142,49 @@ class PolyAutogenReact :
     def on_send(self, agent, data: Any = None):
         self._log_with_task_step(agent.name, "Detected a send call! Reacting accordingly.", data)
 
+    @requires_task
     def on_receive(self, agent, data: Any = None):
         self._log_with_task_step(agent.name, "Detected a receive call! Reacting accordingly.", data)
         self._log_with_task_step(agent.name, "Attempting to save received data to database.", data)
         self.save_to_db_on_receive(data)
         self._log_with_task_step(agent.name, "Received data has been saved to database.", data)
 
+    @requires_task
     def on_initiate_chat(self, agent, data: Any = None):
         self._log_with_task_step(agent.name, "Detected an initiate_chat call! Reacting accordingly.", data)
-        if data and 'current_task_id' in data:
-            self.save_to_workspace(data['current_task_id'], 'initiate_chat_data.json', data)
+        self.record_event(agent, 'initiate_chat', data)
 
+    @requires_task
     def on_register_reply(self, agent, data: Any = None):
         self._log_with_task_step(agent.name, "Detected a register_reply call! Reacting accordingly.", data)
-        if data and 'current_task_id' in data:
-            self.save_to_workspace(data['current_task_id'], 'register_reply_data.json', data)
+        self.record_event(agent, 'register_reply', data)
 
+    @requires_task
     def on_generate_reply(self, agent, data: Any = None):
         self._log_with_task_step(agent.name, "Detected a generate_reply call! Reacting accordingly.", data)
-        if data and 'current_task_id' in data:
-            self.save_to_workspace(data['current_task_id'], 'generate_reply_data.json', data)
+        self.record_event(agent, 'generate_reply', data)
 
+    @requires_task
     def on_execute_code_blocks(self, agent, data: Any = None):
         self._log_with_task_step(agent.name, "Detected an execute_code_blocks call! Reacting accordingly.", data)
-        if data and 'current_task_id' in data:
-            self.save_to_workspace(data['current_task_id'], 'execute_code_blocks_data.json', data)
+        self.record_event(agent, 'execute_code_blocks', data)
 
+    @requires_task
     def on_execute_function(self, agent, data: Any = None):
         self._log_with_task_step(agent.name, "Detected an execute_function call! Reacting accordingly.", data)
-        if data and 'current_task_id' in data:
-            self.save_to_workspace(data['current_task_id'], 'execute_function_data.json', data)
+        self.record_event(agent, 'execute_function', data)
 
+    @requires_task
     def on_generate_init_message(self, agent, data: Any = None):
         self._log_with_task_step(agent.name, "Detected a generate_init_message call! Reacting accordingly.", data)
-        if data and 'current_task_id' in data:
-            self.save_to_workspace(data['current_task_id'], 'generate_init_message_data.json', data)
+        self.record_event(agent, 'generate_init_message', data)
 
+    @requires_task
     def on_register_function(self, agent, data: Any = None):
         self._log_with_task_step(agent.name, "Detected a register_function call! Reacting accordingly.", data)
-        if data and 'current_task_id' in data:
-            self.save_to_workspace(data['current_task_id'], 'register_function_data.json', data)
+        self.record_event(agent, 'register_function', data)
 
+    @requires_task
     def on_get_human_input(self, agent, data: Any = None):
         self._log_with_task_step(agent.name, "Waiting for human input...", data)
-        if data and 'current_task_id' in data:
-            self.save_to_workspace(data['current_task_id'], 'get_human_input_data.json', data)
+        self.record_event(agent, 'get_human_input', data)
@@ -0,0 +1,246 @@
+import asyncio
+import datetime
+import gzip
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import and_, exists
+from sqlalchemy.orm import Session
+
+# Registers the chat, action and task_usage tables on Base.metadata, so their rows are
+# archived and deleted even when the caller has not imported PolyDatabase
+import utils.poly_sqlalchemy  # noqa: F401
+from utils.mongo_db import AgentDB, Base, StepModel, TaskModel
+from utils.poly_logger import PolyLogger
+
+LOG = PolyLogger(__name__)
+
+"""
+Retention for agent.db: old tasks are archived and deleted together with their steps,
+artifacts, chat and action rows, and the database file is periodically compacted.
+
+- Policies select tasks by age and status; a task is finished once it has a completed
+  last step (is_last and status "completed").
+- Selected tasks are archived first, one JSON line per task holding all of its rows,
+  to gzip-compressed segment files in `archive_dir`.
+- Rows are deleted in batches of `batch_size` tasks, one short transaction per batch
+  with a pause in between, so agents writing to the database are never locked out for
+  long.
+- ANALYZE refreshes the planner statistics after each pass; VACUUM, which rewrites the
+  whole file, runs on its own, longer interval.
+"""
+
+DEFAULT_RETENTION_DAYS = float(os.environ.get("POLYGPT_RETENTION_DAYS", "30"))
+DEFAULT_ARCHIVE_DIR = os.environ.get("POLYGPT_ARCHIVE_DIR", "archive")
+
+
+class RetentionPolicy:
+    def __init__(
+        self,
+        name: str,
+        max_age: datetime.timedelta,
+        finished_only: bool = True,
+        archive: bool = True,
+    ):
+        self.name = name
+        self.max_age = max_age
+        self.finished_only = finished_only
+        self.archive = archive
+
+    def __repr__(self) -> str:
+        return (f"RetentionPolicy({self.name!r}, max_age={self.max_age}, "
+                f"finished_only={self.finished_only}, archive={self.archive})")
+
+
+DEFAULT_RETENTION_POLICIES = [
+    RetentionPolicy("finished", datetime.timedelta(days=DEFAULT_RETENTION_DAYS)),
+]
+
+
+def _task_tables():
+    """Tables holding per-task rows, children before tasks so deletes respect foreign keys."""
+    return [
+        table for table in reversed(Base.metadata.sorted_tables)
+        if "task_id" in table.c and table.name != TaskModel.__tablename__
+    ]
+
+
+def _row_dict(row) -> Dict[str, Any]:
+    return {key: value.isoformat() if isinstance(value, datetime.datetime) else value
+            for key, value in row._mapping.items()}
+
+
+class RetentionManager:
+    def __init__(
+        self,
+        database: AgentDB,
+        policies: Optional[Sequence[RetentionPolicy]] = None,
+        archive_dir: str = DEFAULT_ARCHIVE_DIR,
+        batch_size: int = 100,
+        batch_pause: float = 0.05,
+        name: str = "polygpt-retention",
+    ):
+        self.database = database
+        self.policies = list(policies if policies is not None else DEFAULT_RETENTION_POLICIES)
+        self.archive_dir = archive_dir
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.name = name
+
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        self.tasks_archived = 0
+        self.tasks_deleted = 0
+        self.rows_deleted = 0
+        self.segments_written = 0
+        self.last_vacuum: Optional[float] = None
+
+    async def apply(self, now: Optional[datetime.datetime] = None) -> Dict[str, int]:
+        """Run every policy once. Returns the number of tasks removed per policy."""
+        now = now or datetime.datetime.utcnow()
+        removed = {}
+        for policy in self.policies:
+            removed[policy.name] = await self._apply_policy(policy, now)
+        if any(removed.values()):
+            self.database.clear_caches()
+        LOG.info(f"Retention pass removed {removed}")
+        return removed
+
+    async def compact(self, vacuum: bool = False):
+        """Refresh planner statistics, and optionally rewrite the file to reclaim space."""
+        def run(session: Session):
+            # VACUUM cannot run inside a transaction
+            connection = session.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+            sqlite = connection.dialect.name == "sqlite"
+            if vacuum:
+                connection.exec_driver_sql("VACUUM")
+                if sqlite:
+                    connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+            connection.exec_driver_sql("ANALYZE")
+            if sqlite:
+                connection.exec_driver_sql("PRAGMA optimize")
+
+        started = time.perf_counter()
+        await self.database.run_in_session(run)
+        if vacuum:
+            self.last_vacuum = time.time()
+        LOG.info(f"Database {'vacuumed and ' if vacuum else ''}analyzed in {time.perf_counter() - started:.2f}s")
+
+    def start(self, interval: float = 3600.0, vacuum_interval: float = 7 * 24 * 3600.0):
+        """Apply the policies every `interval` seconds and VACUUM every `vacuum_interval`."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._schedule, args=(interval, vacuum_interval), name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        thread = self._thread
+        if thread is None:
+            return
+        # Also interrupts a pass between batches
+        self._stop.set()
+        thread.join(timeout)
+        self._thread = None
+        self._stop.clear()
+
+    def stats(self) -> dict:
+        return {
+            "tasks_archived": self.tasks_archived,
+            "tasks_deleted": self.tasks_deleted,
+            "rows_deleted": self.rows_deleted,
+            "segments_written": self.segments_written,
+            "last_vacuum": self.last_vacuum,
+        }
+
+    def _schedule(self, interval: float, vacuum_interval: float):
+        loop = asyncio.new_event_loop()
+        next_vacuum = time.monotonic() + vacuum_interval
+        try:
+            while not self._stop.wait(interval):
+                try:
+                    loop.run_until_complete(self.apply())
+                    vacuum = time.monotonic() >= next_vacuum
+                    loop.run_until_complete(self.compact(vacuum=vacuum))
+                    if vacuum:
+                        next_vacuum = time.monotonic() + vacuum_interval
+                except Exception as e:
+                    LOG.error(f"Retention pass failed: {e}")
+        finally:
+            loop.close()
+
+    async def _apply_policy(self, policy: RetentionPolicy, now: datetime.datetime) -> int:
+        cutoff = now - policy.max_age
+        removed = 0
+        while not self._stop.is_set():
+            task_ids = await self.database.run_in_session(
+                lambda session: self._select_tasks(session, policy, cutoff))
+            if not task_ids:
+                break
+            if policy.archive:
+                records = await self.database.run_in_session(lambda session: self._read_tasks(session, task_ids))
+                self._write_segment(policy, records)
+                self.tasks_archived += len(records)
+            self.rows_deleted += await self.database.run_in_session(lambda session: self._delete_tasks(session, task_ids))
+            self.tasks_deleted += len(task_ids)
+            removed += len(task_ids)
+            if len(task_ids) < self.batch_size:
+                break
+            await asyncio.sleep(self.batch_pause)
+        return removed
+
+    def _select_tasks(self, session: Session, policy: RetentionPolicy, cutoff: datetime.datetime) -> List[str]:
+        query = session.query(TaskModel.task_id).filter(TaskModel.created_at < cutoff)
+        if policy.finished_only:
+            query = query.filter(exists().where(and_(
+                StepModel.task_id == TaskModel.task_id,
+                StepModel.is_last.is_(True),
+                StepModel.status == "completed",
+            )))
+        rows = query.order_by(TaskModel.created_at, TaskModel.task_id).limit(self.batch_size).all()
+        return [row.task_id for row in rows]
+
+    def _read_tasks(self, session: Session, task_ids: List[str]) -> List[Dict[str, Any]]:
+        tasks_table = TaskModel.__table__
+        records = {
+            row.task_id: {"task": _row_dict(row)}
+            for row in session.execute(tasks_table.select().where(tasks_table.c.task_id.in_(task_ids)))
+        }
+        for table in _task_tables():
+            for row in session.execute(table.select().where(table.c.task_id.in_(task_ids))):
+                records[row.task_id].setdefault(table.name, []).append(_row_dict(row))
+        return list(records.values())
+
+    def _delete_tasks(self, session: Session, task_ids: List[str]) -> int:
+        deleted = 0
+        for table in _task_tables() + [TaskModel.__table__]:
+            deleted += session.execute(table.delete().where(table.c.task_id.in_(task_ids))).rowcount
+        session.commit()
+        return deleted
+
+    def _write_segment(self, policy: RetentionPolicy, records: List[Dict[str, Any]]):
+        """Write one gzip JSONL segment; it is fsynced before the rows are deleted."""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        path = os.path.join(self.archive_dir, f"{policy.name}-{stamp}.jsonl.gz")
+        with open(path, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                for record in records:
+                    f.write(json.dumps(record, default=str).encode("utf-8") + b"\n")
+            raw.flush()
+            os.fsync(raw.fileno())
+        self.segments_written += 1
+        LOG.info(f"Archived {len(records)} tasks to {path}")
+
+
+def read_archive(path: str):
+    """Yield the task records of an archive segment."""
+    with gzip.open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
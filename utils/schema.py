@@ -27,6 +27,20 @@ class Pagination(BaseModel):
     page_size: int = Field(..., description="Number of items per page.", example=25)
 
 
+class CursorPagination(BaseModel):
+    next_cursor: Optional[str] = Field(
+        None,
+        description="Opaque cursor for the next page, or null on the last page.",
+        example="eyJ0IjogIjIwMjMtMDEtMDFUMDA6MDA6MDAiLCAiaWQiOiAiNTAifQ",
+    )
+    page_size: int = Field(..., description="Number of items per page.", example=25)
+    total_items: Optional[int] = Field(
+        None,
+        description="Total number of items, possibly cached, when requested.",
+        example=42,
+    )
+
+
 class Artifact(BaseModel):
     created_at: datetime = Field(
         ...,
@@ -0,0 +1,257 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.metrics import QUANTILES, LatencyHistogram, _escape, register_collector
+from utils.poly_logger import PolyLogger
+
+LOG = PolyLogger(__name__)
+
+"""
+Token usage and cost of every LLM response, per agent, model and task.
+UsageRegistry keeps plain counters and a latency histogram per (agent, model) for the
+Prometheus endpoint, plus per-task totals that are drained into the database by
+PolyDatabase.add_task_usage. install_completion_hook wraps autogen's
+ChatCompletion.create so every completion is timed and its usage recorded here; the
+completion content itself is not logged. The calling agent and task are
+taken from CURRENT_AGENT and CURRENT_TASK, which AutogenMonitor sets from its own agent
+and task context around every wrapped agent method.
+"""
+
+# Name of the agent whose monitored method is currently running
+CURRENT_AGENT: ContextVar[Optional[str]] = ContextVar("polygpt_current_agent", default=None)
+# Task attached to that agent's monitor, if any
+CURRENT_TASK: ContextVar[Optional[str]] = ContextVar("polygpt_current_task", default=None)
+
+UNKNOWN = "unknown"
+
+# USD per 1000 (prompt, completion) tokens, matched on the longest model name prefix.
+# Responses that carry their own "cost" (autogen >= 0.1.10) are not re-priced.
+MODEL_PRICES_PER_1K: Dict[str, Tuple[float, float]] = {
+    "gpt-3.5-turbo": (0.0015, 0.002),
+    "gpt-3.5-turbo-16k": (0.003, 0.004),
+    "gpt-35-turbo": (0.0015, 0.002),
+    "gpt-35-turbo-16k": (0.003, 0.004),
+    "gpt-4": (0.03, 0.06),
+    "gpt-4-32k": (0.06, 0.12),
+    "gpt-4-1106-preview": (0.01, 0.03),
+}
+
+# Per-task rows are only kept in memory until drained; beyond this many tasks the
+# oldest pending one is dropped rather than growing without bound
+MAX_PENDING_TASKS = int(os.environ.get("POLYGPT_USAGE_MAX_PENDING_TASKS", "10000"))
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prices = None
+    for name in sorted(MODEL_PRICES_PER_1K, key=len, reverse=True):
+        if model.startswith(name):
+            prices = MODEL_PRICES_PER_1K[name]
+            break
+    if prices is None:
+        return 0.0
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1000
+
+
+def parse_chat_response(response: Any) -> Dict[str, Any]:
+    """Return an OpenAI chat completion as a dict, whether given as JSON, a dict or an SDK object."""
+    if isinstance(response, dict):
+        return response
+    if isinstance(response, (str, bytes)):
+        return json.loads(response)
+    for method in ("model_dump", "to_dict_recursive", "to_dict"):
+        if hasattr(response, method):
+            return getattr(response, method)()
+    raise TypeError(f"Unsupported chat response type: {type(response).__name__}")
+
+
+class UsageStats:
+    __slots__ = ("calls", "prompt_tokens", "completion_tokens", "cost", "latency")
+
+    def __init__(self, with_latency: bool = True):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self.latency = LatencyHistogram() if with_latency else 0.0
+
+    def add(self, prompt_tokens: int, completion_tokens: int, cost: float, latency: Optional[float]):
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.cost += cost
+        if latency is not None:
+            if isinstance(self.latency, LatencyHistogram):
+                self.latency.record(latency)
+            else:
+                self.latency += latency
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "cost": self.cost,
+            "latency": self.latency.snapshot() if isinstance(self.latency, LatencyHistogram) else self.latency,
+        }
+
+
+class UsageRegistry:
+    """Token, cost and latency counters per (agent, model), and pending totals per task."""
+
+    def __init__(self, namespace: str = "polygpt_llm"):
+        self.namespace = namespace
+        self._stats: Dict[Tuple[str, str], UsageStats] = {}
+        # task_id -> (agent, model) -> totals not yet written to the database
+        self._pending: Dict[str, Dict[Tuple[str, str], UsageStats]] = {}
+        self._lock = threading.Lock()
+        self.pending_dropped = 0
+
+    def record(self, model: str, prompt_tokens: int, completion_tokens: int,
+               latency: Optional[float] = None, agent: Optional[str] = None,
+               task_id: Optional[str] = None, cost: Optional[float] = None):
+        agent = agent or CURRENT_AGENT.get() or UNKNOWN
+        model = model or UNKNOWN
+        if cost is None:
+            cost = estimate_cost(model, prompt_tokens, completion_tokens)
+        key = (agent, model)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = UsageStats()
+            stats.add(prompt_tokens, completion_tokens, cost, latency)
+            if task_id is not None:
+                task = self._pending.get(task_id)
+                if task is None:
+                    if len(self._pending) >= MAX_PENDING_TASKS:
+                        del self._pending[next(iter(self._pending))]
+                        self.pending_dropped += 1
+                    task = self._pending[task_id] = {}
+                task_stats = task.get(key)
+                if task_stats is None:
+                    task_stats = task[key] = UsageStats(with_latency=False)
+                task_stats.add(prompt_tokens, completion_tokens, cost, latency)
+
+    def record_response(self, response: Dict[str, Any], latency: Optional[float] = None,
+                        agent: Optional[str] = None, task_id: Optional[str] = None):
+        """Record the usage block of a parsed chat completion; responses without one are ignored."""
+        usage = response.get("usage")
+        if not usage:
+            return
+        self.record(
+            response.get("model"),
+            usage.get("prompt_tokens", 0) or 0,
+            usage.get("completion_tokens", 0) or 0,
+            latency=latency, agent=agent, task_id=task_id, cost=response.get("cost"),
+        )
+
+    def drain_tasks(self, task_ids: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Hand over and forget the totals of the given tasks recorded since their last drain."""
+        with self._lock:
+            pending = {task_id: self._pending.pop(task_id) for task_id in task_ids
+                       if task_id in self._pending}
+        return {
+            task_id: [
+                {"agent": agent, "model": model, "calls": stats.calls,
+                 "prompt_tokens": stats.prompt_tokens, "completion_tokens": stats.completion_tokens,
+                 "cost": stats.cost, "latency_seconds": stats.latency}
+                for (agent, model), stats in rows.items()
+            ]
+            for task_id, rows in pending.items()
+        }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._pending.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, dict]]:
+        result: Dict[str, Dict[str, dict]] = {}
+        with self._lock:
+            for (agent, model), stats in sorted(self._stats.items()):
+                result.setdefault(agent, {})[model] = stats.snapshot()
+        return result
+
+    def top_agents(self, limit: int = 5) -> List[Tuple[str, int]]:
+        """Agents ordered by total tokens, the chattiest first."""
+        totals: Dict[str, int] = {}
+        with self._lock:
+            for (agent, _), stats in self._stats.items():
+                totals[agent] = totals.get(agent, 0) + stats.total_tokens
+        return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    def to_prometheus(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            items = sorted(self._stats.items())
+            for metric, attribute in (
+                ("requests_total", "calls"),
+                ("prompt_tokens_total", "prompt_tokens"),
+                ("completion_tokens_total", "completion_tokens"),
+                ("cost_usd_total", "cost"),
+            ):
+                name = f"{self.namespace}_{metric}"
+                lines.append(f"# TYPE {name} counter")
+                for (agent, model), stats in items:
+                    lines.append(
+                        f'{name}{{agent="{_escape(agent)}",model="{_escape(model)}"}} '
+                        f'{getattr(stats, attribute)}')
+
+            name = f"{self.namespace}_latency_seconds"
+            lines.append(f"# TYPE {name} summary")
+            for (agent, model), stats in items:
+                labels = f'agent="{_escape(agent)}",model="{_escape(model)}"'
+                for q in QUANTILES:
+                    lines.append(f'{name}{{{labels},quantile="{q}"}} {stats.latency.percentile(q):.6f}')
+                lines.append(f"{name}_sum{{{labels}}} {stats.latency.total:.6f}")
+                lines.append(f"{name}_count{{{labels}}} {stats.latency.count}")
+        return "\n".join(lines) + "\n"
+
+
+USAGE_METRICS = UsageRegistry()
+register_collector(USAGE_METRICS)
+
+
+# autogen's create() calls itself once per entry of a config_list; only the outermost
+# call is recorded
+_in_create: ContextVar[bool] = ContextVar("polygpt_in_completion_create", default=False)
+
+
+def install_completion_hook(completion_cls):
+    """
+    Wrap completion_cls.create (autogen's ChatCompletion) so the usage of every response
+    is timed and recorded for CURRENT_AGENT and CURRENT_TASK. Installing twice is a no-op.
+    """
+    create = completion_cls.create
+    if getattr(create, "_polygpt_usage_hook", False):
+        return
+
+    @functools.wraps(create)
+    def timed_create(*args, **kwargs):
+        if _in_create.get():
+            return create(*args, **kwargs)
+        token = _in_create.set(True)
+        started = time.perf_counter()
+        try:
+            response = create(*args, **kwargs)
+        finally:
+            _in_create.reset(token)
+        latency = time.perf_counter() - started
+        try:
+            USAGE_METRICS.record_response(
+                parse_chat_response(response), latency=latency, task_id=CURRENT_TASK.get())
+        except Exception as e:
+            LOG.error(f"Error recording LLM usage: {e}")
+        return response
+
+    timed_create._polygpt_usage_hook = True
+    completion_cls.create = staticmethod(timed_create)
@@ -1,8 +1,23 @@
 import abc
+import contextlib
+import hashlib
+import io
+import mmap
 import os
+import shutil
+import threading
 import typing
+import uuid
 from pathlib import Path
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Buffer size used when copying files in chunks
+STREAM_CHUNK_SIZE = 1024 * 1024
+
 
 class Workspace(abc.ABC):
     @abc.abstractclassmethod
@@ -17,6 +32,31 @@ class Workspace(abc.ABC):
     def write(self, task_id: str, path: str, data: bytes) -> None:
         pass
 
+    @abc.abstractclassmethod
+    def append(self, task_id: str, path: str, data: bytes) -> int:
+        """Append data to a file, creating it if needed. Returns the offset it was written at."""
+        pass
+
+    @abc.abstractclassmethod
+    def open_read(self, task_id: str, path: str) -> typing.BinaryIO:
+        """Open a file for streaming reads. The caller closes it."""
+        pass
+
+    @abc.abstractclassmethod
+    def open_write(self, task_id: str, path: str) -> typing.BinaryIO:
+        """Open a file for streaming writes, replacing it. Data is complete once it is closed."""
+        pass
+
+    @abc.abstractclassmethod
+    def read_range(self, task_id: str, path: str, offset: int, length: int) -> bytes:
+        """Read up to length bytes starting at offset."""
+        pass
+
+    @abc.abstractclassmethod
+    def mmap(self, task_id: str, path: str) -> typing.ContextManager[memoryview]:
+        """Context manager giving a read-only, zero-copy view of the whole file."""
+        pass
+
     @abc.abstractclassmethod
     def delete(
         self, task_id: str, path: str, directory: bool = False, recursive: bool = False
@@ -35,49 +75,350 @@ class Workspace(abc.ABC):
 class LocalWorkspace(Workspace):
     def __init__(self, base_path: str):
         self.base_path = Path(base_path).resolve()
+        self._base = str(self.base_path)
+        self._base_prefix = os.path.join(self._base, "")
+        # task_id -> resolved task root
+        self._task_roots: typing.Dict[str, str] = {}
+        # Directories whose real path was checked to be inside the base, mapped to
+        # whether they are known to exist
+        self._dirs: typing.Dict[str, bool] = {}
+
+    def _inside_base(self, path: str) -> bool:
+        return path == self._base or path.startswith(self._base_prefix)
+
+    def _task_root(self, task_id: str) -> str:
+        root = self._task_roots.get(task_id)
+        if root is None:
+            root = os.path.realpath(os.path.join(self._base, task_id))
+            if not self._inside_base(root):
+                raise ValueError(f"Directory traversal is not allowed! - {root}")
+            self._task_roots[task_id] = root
+        return root
 
-    def _resolve_path(self, task_id: str, path: str) -> Path:
+    def _resolve_path(self, task_id: str, path: str, create_parents: bool = False) -> Path:
+        """
+        Absolute path of a file in the task's directory. Symlinks may not lead out of
+        the base path: the parent directory's real path is checked once per directory,
+        a symlinked file on every call. Parent directories are only created for writes
+        (create_parents), and each directory only once.
+        """
         path = str(path)
         path = path if not path.startswith("/") else path[1:]
-        abs_path = (self.base_path / task_id / path).resolve()
-        if not str(abs_path).startswith(str(self.base_path)):
-            print("Error")
+        abs_path = os.path.normpath(os.path.join(self._task_root(task_id), path))
+        if not self._inside_base(abs_path):
             raise ValueError(f"Directory traversal is not allowed! - {abs_path}")
+        directory = os.path.dirname(abs_path)
+        self._check_dir(directory)
+        if os.path.islink(abs_path) and not self._inside_base(os.path.realpath(abs_path)):
+            raise ValueError(f"Directory traversal is not allowed! - {abs_path}")
+        if create_parents:
+            self._ensure_dir(directory)
+        return Path(abs_path)
+
+    def _check_dir(self, directory: str):
+        if directory in self._dirs:
+            return
+        real_path = os.path.realpath(directory)
+        if not self._inside_base(real_path):
+            raise ValueError(f"Directory traversal is not allowed! - {real_path}")
+        self._dirs[directory] = False
+
+    def _ensure_dir(self, directory: str):
+        if not self._dirs.get(directory):
+            os.makedirs(directory, exist_ok=True)
+            self._dirs[directory] = True
+
+    def _open_for_write(self, file_path: Path, mode: str) -> typing.BinaryIO:
         try:
-            abs_path.parent.mkdir(parents=True, exist_ok=True)
-        except FileExistsError:
-            pass
-        return abs_path
+            return open(file_path, mode)
+        except FileNotFoundError:
+            # The directory was removed since it was cached
+            directory = str(file_path.parent)
+            self._dirs.pop(directory, None)
+            self._check_dir(directory)
+            self._ensure_dir(directory)
+            return open(file_path, mode)
 
     def read(self, task_id: str, path: str) -> bytes:
         with open(self._resolve_path(task_id, path), "rb") as f:
             return f.read()
 
     def write(self, task_id: str, path: str, data: bytes) -> None:
-        file_path = self._resolve_path(task_id, path)
-        with open(file_path, "wb") as f:
+        file_path = self._resolve_path(task_id, path, create_parents=True)
+        with self._open_for_write(file_path, "wb") as f:
             f.write(data)
 
+    def append(self, task_id: str, path: str, data: bytes) -> int:
+        file_path = self._resolve_path(task_id, path, create_parents=True)
+        with self._open_for_write(file_path, "ab") as f:
+            offset = f.tell()
+            f.write(data)
+        return offset
+
+    def open_read(self, task_id: str, path: str) -> typing.BinaryIO:
+        return open(self._resolve_path(task_id, path), "rb")
+
+    def open_write(self, task_id: str, path: str) -> typing.BinaryIO:
+        return self._open_for_write(self._resolve_path(task_id, path, create_parents=True), "wb")
+
+    def read_range(self, task_id: str, path: str, offset: int, length: int) -> bytes:
+        with self.open_read(task_id, path) as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def mmap(self, task_id: str, path: str) -> typing.ContextManager[memoryview]:
+        return _mmap_file(self._resolve_path(task_id, path))
+
     def delete(
         self, task_id: str, path: str, directory: bool = False, recursive: bool = False
     ) -> None:
-        path = self.base_path / task_id / path
         resolved_path = self._resolve_path(task_id, path)
         if directory:
             if recursive:
                 os.rmdir(resolved_path)
             else:
                 os.removedirs(resolved_path)
+            # removedirs also prunes empty parents, so forget every cached directory;
+            # a removed directory may come back as a symlink, so check the roots again
+            self._dirs.clear()
+            self._task_roots.clear()
         else:
             os.remove(resolved_path)
 
     def exists(self, task_id: str, path: str) -> bool:
-        path = self.base_path / task_id / path
         return self._resolve_path(task_id, path).exists()
 
     def list(self, task_id: str, path: str) -> typing.List[str]:
-        path = self.base_path / task_id / path
         base = self._resolve_path(task_id, path)
         if not base.exists() or not base.is_dir():
             return []
-        return [str(p.relative_to(self.base_path / task_id)) for p in base.iterdir()]
+        return [str(p.relative_to(self._task_root(task_id))) for p in base.iterdir()]
+
+
+@contextlib.contextmanager
+def _mmap_file(file_path: Path) -> typing.Iterator[memoryview]:
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # mmap cannot map an empty file
+            yield memoryview(b"")
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        try:
+            yield view
+        finally:
+            view.release()
+            mapped.close()
+
+class ContentAddressedWorkspace(LocalWorkspace):
+    """
+    LocalWorkspace that stores each distinct file content once.
+
+    Written data goes to a blob named by its SHA-256 under `.blobs/ab/<digest>`, and
+    the per-task path gets a small reference file pointing at it. Each blob has a
+    reference count, so it is deleted together with its last reference. Blobs can be
+    zstd-compressed (`<digest>.zst`, requires the `zstandard` package). Appended
+    files, such as the event log segments, stay plain files, as do files written
+    before this mode was on.
+    """
+
+    BLOB_DIR = ".blobs"
+    REF_MAGIC = b"POLYGPT-BLOB-REF sha256:"
+
+    def __init__(self, base_path: str, compression: typing.Optional[str] = None, compression_level: int = 3):
+        super().__init__(base_path)
+        if compression not in (None, "zstd"):
+            raise ValueError(f"Unknown workspace compression: {compression}. Available: zstd")
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        self.compression = compression
+        self.compression_level = compression_level
+        self.blob_path = self.base_path / self.BLOB_DIR
+        self._ref_size = len(self.REF_MAGIC) + hashlib.sha256().digest_size * 2 + 1
+        self._lock = threading.Lock()
+
+    def read(self, task_id: str, path: str) -> bytes:
+        with self.open_read(task_id, path) as f:
+            return f.read()
+
+    def write(self, task_id: str, path: str, data: bytes) -> None:
+        with self.open_write(task_id, path) as f:
+            f.write(data)
+
+    def open_read(self, task_id: str, path: str) -> typing.BinaryIO:
+        file_path = self._resolve_path(task_id, path)
+        digest = self._ref_at(file_path)
+        if digest is None:
+            return open(file_path, "rb")
+        blob_file = self._blob_file(digest)
+        if blob_file.suffix == ".zst":
+            if zstandard is None:
+                raise ValueError(f"Blob {digest} is zstd-compressed but zstandard is not installed")
+            return zstandard.ZstdDecompressor().stream_reader(open(blob_file, "rb"), closefd=True)
+        return open(blob_file, "rb")
+
+    def open_write(self, task_id: str, path: str) -> typing.BinaryIO:
+        return _BlobWriter(self, self._resolve_path(task_id, path, create_parents=True))
+
+    @contextlib.contextmanager
+    def mmap(self, task_id: str, path: str) -> typing.Iterator[memoryview]:
+        file_path = self._resolve_path(task_id, path)
+        digest = self._ref_at(file_path)
+        if digest is not None and self._blob_file(digest).suffix == ".zst":
+            # A compressed blob has no on-disk image to map
+            yield memoryview(self.read(task_id, path))
+            return
+        with _mmap_file(file_path if digest is None else self._blob_file(digest)) as view:
+            yield view
+
+    def append(self, task_id: str, path: str, data: bytes) -> int:
+        file_path = self._resolve_path(task_id, path, create_parents=True)
+        with self._lock:
+            digest = self._ref_at(file_path)
+            if digest is not None:
+                # Turn the reference back into a plain file before appending to it
+                tmp_path = self._tmp_path(file_path)
+                with self.open_read(task_id, path) as src, open(tmp_path, "wb") as dst:
+                    shutil.copyfileobj(src, dst, STREAM_CHUNK_SIZE)
+                os.replace(tmp_path, file_path)
+                self._release_blob(digest)
+            return super().append(task_id, path, data)
+
+    def delete(
+        self, task_id: str, path: str, directory: bool = False, recursive: bool = False
+    ) -> None:
+        if directory:
+            return super().delete(task_id, path, directory, recursive)
+        file_path = self._resolve_path(task_id, path)
+        with self._lock:
+            digest = self._ref_at(file_path)
+            os.remove(file_path)
+            if digest is not None:
+                self._release_blob(digest)
+
+    def blob_stats(self) -> typing.Dict[str, int]:
+        blobs = [p for p in self.blob_path.glob("*/*") if p.suffix in ("", ".zst")]
+        return {"blobs": len(blobs), "bytes": sum(p.stat().st_size for p in blobs)}
+
+    def _ref_at(self, file_path: Path) -> typing.Optional[str]:
+        try:
+            if file_path.stat().st_size != self._ref_size:
+                return None
+            with open(file_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if not data.startswith(self.REF_MAGIC):
+            return None
+        return data[len(self.REF_MAGIC):-1].decode("ascii")
+
+    def _blob_file(self, digest: str) -> Path:
+        raw = self.blob_path / digest[:2] / digest
+        compressed = raw.with_suffix(".zst")
+        return compressed if compressed.exists() else raw
+
+    def _commit_blob(self, file_path: Path, tmp_blob: Path, digest: str, size: int):
+        """Move a fully written temporary blob into the store and point file_path at it."""
+        with self._lock:
+            previous = self._ref_at(file_path)
+            if previous == digest:
+                os.remove(tmp_blob)
+                return
+            refs = self._refcount(digest)
+            blob_file = self.blob_path / digest[:2] / digest
+            if refs == 0 or not self._blob_file(digest).exists():
+                self._ensure_dir(str(blob_file.parent))
+                if self.compression == "zstd" and self._compress(tmp_blob, blob_file.with_suffix(".zst"), size):
+                    os.remove(tmp_blob)
+                else:
+                    os.replace(tmp_blob, blob_file)
+            else:
+                os.remove(tmp_blob)
+            self._set_refcount(digest, refs + 1)
+            self._replace(file_path, self.REF_MAGIC + digest.encode("ascii") + b"\n")
+            if previous is not None:
+                self._release_blob(previous)
+
+    def _compress(self, source: Path, target: Path, size: int) -> bool:
+        """Compress source into target; keep it only if it is smaller."""
+        tmp_path = self._tmp_path(target)
+        compressor = zstandard.ZstdCompressor(level=self.compression_level)
+        with open(source, "rb") as src, open(tmp_path, "wb") as dst:
+            compressor.copy_stream(src, dst, size=size)
+        if os.path.getsize(tmp_path) >= size:
+            os.remove(tmp_path)
+            return False
+        os.replace(tmp_path, target)
+        return True
+
+    def _release_blob(self, digest: str):
+        refs = self._refcount(digest) - 1
+        if refs > 0:
+            self._set_refcount(digest, refs)
+            return
+        raw = self.blob_path / digest[:2] / digest
+        for file in (raw, raw.with_suffix(".zst"), raw.with_suffix(".refs")):
+            try:
+                os.remove(file)
+            except FileNotFoundError:
+                pass
+
+    def _refcount(self, digest: str) -> int:
+        try:
+            with open(self.blob_path / digest[:2] / f"{digest}.refs", "rb") as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _set_refcount(self, digest: str, refs: int):
+        self._replace(self.blob_path / digest[:2] / f"{digest}.refs", str(refs).encode("ascii"))
+
+    @staticmethod
+    def _tmp_path(file_path: Path) -> Path:
+        return file_path.with_name(f".{file_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+    def _replace(self, file_path: Path, data: bytes):
+        """Write via a temporary file and rename, so readers never see partial content."""
+        tmp_path = self._tmp_path(file_path)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, file_path)
+
+
+class _BlobWriter(io.RawIOBase):
+    """Streams into a temporary blob while hashing; stored and referenced on close."""
+
+    def __init__(self, workspace: ContentAddressedWorkspace, file_path: Path):
+        super().__init__()
+        self._workspace = workspace
+        self._file_path = file_path
+        workspace._ensure_dir(str(workspace.blob_path))
+        self._tmp_blob = workspace.blob_path / f".incoming.{uuid.uuid4().hex}.tmp"
+        self._file = open(self._tmp_blob, "wb")
+        self._hash = hashlib.sha256()
+        self._size = 0
+        self._failed = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._hash.update(data)
+        self._file.write(data)
+        self._size += len(data)
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self._file.close()
+        super().close()
+        if self._failed:
+            os.remove(self._tmp_blob)
+            return
+        self._workspace._commit_blob(self._file_path, self._tmp_blob, self._hash.hexdigest(), self._size)
+
+    def __exit__(self, exc_type, exc, tb):
+        # Do not publish a partially written file
+        self._failed = exc_type is not None
+        self.close()